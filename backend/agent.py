@@ -1,34 +1,22 @@
-import os
-from pymongo import MongoClient
-from dotenv import load_dotenv
-
 # Import your components
+import llm_client
 from llm_client import safe_call_gemini_chat
+from chat_router import answer_structured
 from scraper import scrape
 from scraper.normalize import normalize_scraped
-from db import get_db_client # Uses your existing db.py
+import db
+import listing_stats
 
-load_dotenv()
+# Heavy clients (Gemini, Mongo) are created lazily on first use.
+# Servers that would rather pay that cost before taking traffic call warmup().
+def warmup():
+    llm_client.warmup()
+    db.get_db_client()
 
 # --- 1. The Ground Truth Lookup (Fixed to use Address) ---
 def fetch_canonical_by_address(address_text):
-    if not address_text:
-        return None
-
-    client = get_db_client()
-    db = client.property_db
-
-    # Use first 15 chars for fuzzy match
-    search_term = address_text[:15]
-
-    # ✅ THE FIX: Ensure this says "address.line1"
-    record = db.listings.find_one({
-        "address.line1": {
-            "$regex": search_term, 
-            "$options": "i"
-        }
-    })
-    return record
+    # Fuzzy "address.line1" match; routed to secondaries when MONGO_READ_PREFERENCE allows
+    return db.find_canonical_by_address(address_text)
 
 def extract_rich_details(raw_text_data):
     """
@@ -108,6 +96,26 @@ def run_workflow_sync(initial_state):
         print("No internal records found.")
         state["raw_data"].append({"source": "OFFICIAL RECORD", "data": "No matching records found."})
 
+    # STEP C2: NEIGHBORHOOD PRICE STATS (materialized by listing_stats.py)
+    # Lets us flag a suspicious price even when there is no exact ground-truth match.
+    address = dict(normalized.get("address") or {})
+    if canonical and not address.get("zip"):
+        address["zip"] = (canonical.get("address") or {}).get("zip")
+    try:
+        stats_row = listing_stats.neighborhood_stats(
+            address, normalized.get("beds"), listing_stats.listing_type(normalized)
+        )
+    except Exception as e:
+        print(f"Neighborhood stats lookup failed: {e}")
+        stats_row = None
+    if stats_row:
+        state["raw_data"].append({
+            "source": "NEIGHBORHOOD STATS",
+            "data": listing_stats.assess_price(normalized, stats_row)
+        })
+    else:
+        state["raw_data"].append({"source": "NEIGHBORHOOD STATS", "data": "No neighborhood statistics available."})
+
     # STEP D: PREPARE CONTEXT
     # Turn the list of data dictionaries into a string for Gemini
     context_str = ""
@@ -123,6 +131,7 @@ def run_workflow_sync(initial_state):
         "STRICT RULES:\n"
         "1. ONLY report a discrepancy if BOTH sources have data but they disagree (e.g. Web price $500k vs Tax value $300k).\n"
         "2. If the 'OFFICIAL RECORD' is missing or says 'No matching records', return exactly: 'No discrepancies found (Ground truth unavailable).'\n"
+        "   EXCEPTION: always report any 'flags' listed under 'NEIGHBORHOOD STATS' as price anomalies, even without an official record.\n"
         "3. Do NOT flag missing data as a warning."
     )
     discrepancies = safe_call_gemini_chat(analyst_system, context_str)
@@ -145,8 +154,14 @@ def chat_with_brief(state, user_message):
     """
     Called by app.py when the user sends a message.
     It builds a complete 'Property Dossier' including Web Data, AI Features, and Official Records.
+    Field lookups and simple comparisons are answered straight from the state
+    (with source citations) and never reach the LLM.
     """
-    
+    # 0. Fast path: typed-field questions don't need Gemini
+    structured = answer_structured(state, user_message)
+    if structured is not None:
+        return structured
+
     # 1. Extract Web Data (The "Live" listing)
     web_listing = {}
     for item in state.get('raw_data', []):
@@ -178,7 +193,14 @@ def chat_with_brief(state, user_message):
                 tax_record = str(data)
             break
             
-    # 4. Construct the Dossier
+    # 4. Extract NEIGHBORHOOD STATS (price distribution for the area)
+    neighborhood = "Not Available"
+    for item in state.get('raw_data', []):
+        if item.get('source') == "NEIGHBORHOOD STATS":
+            neighborhood = item.get('data')
+            break
+
+    # 5. Construct the Dossier
     context = f"""
     You are an expert Real Estate Analyst. Answer the user's question using ONLY the data below.
     
@@ -198,9 +220,12 @@ def chat_with_brief(state, user_message):
     === 4. ANALYSIS & ALERTS ===
     Summary: {state.get('summary')}
     Discrepancies: {state.get('discrepancies')}
+
+    === 5. NEIGHBORHOOD PRICE STATS ===
+    {neighborhood}
     """
     
-    # 5. System Prompt
+    # 6. System Prompt
     system_prompt = (
         "You are a helpful Real Estate Assistant. "
         "Use the provided 'OFFICIAL RECORD' to verify claims if asked. "
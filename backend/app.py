@@ -1,12 +1,23 @@
 # app.py
+import os
 import uuid
 import threading
 import time
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+from config import load_env
+import coalesce
+import export
 from agent import run_workflow_sync  # returns final state dict
-from db import get_result, save_result
-from agent import chat_with_brief
+from db import get_result, save_result, pool_stats
+from agent import chat_with_brief, warmup
+from llm_client import latency_stats
+
+load_env()
+
+# Set EAGER_INIT=1 to build the Gemini/Mongo clients at startup instead of on the first request
+if os.getenv("EAGER_INIT", "0") == "1":
+    warmup()
 
 app = Flask(__name__)
 CORS(app)
@@ -14,7 +25,24 @@ CORS(app)
 # Simple in-memory job store for demo; replace with Redis or DB in prod
 _job_store = {}
 
-def _background_job(job_id, address):
+def _release_lease(release, *args):
+    try:
+        release(*args)
+    except Exception as e:
+        print(f"Coalescing lease update failed: {e}")
+
+def _workflow_error(state):
+    """
+    run_workflow_sync reports scrape/LLM failures inside the state (e.g. a
+    summary of "Error: Could not scrape data..."), not by raising.
+    """
+    for field in ("summary", "discrepancies"):
+        value = state.get(field)
+        if isinstance(value, str) and value.startswith("Error:"):
+            return value
+    return None
+
+def _background_job(job_id, address, coalesce_key=None):
     try:
         initial_state = {"address": address, "raw_data": [], "discrepancies": [], "summary": ""}
         result = run_workflow_sync(initial_state)
@@ -23,6 +51,18 @@ def _background_job(job_id, address):
     except Exception as e:
         _job_store[job_id]["status"] = "failed"
         _job_store[job_id]["error"] = str(e)
+        if coalesce_key:
+            _release_lease(coalesce.fail, coalesce_key, job_id, str(e))
+        return
+    if not coalesce_key:
+        return
+    error = _workflow_error(result)
+    if error:
+        # Don't fan out or reuse a failed analysis; let the next request take over
+        _release_lease(coalesce.fail, coalesce_key, job_id, error)
+    else:
+        # Fan the result out to every request that attached while we ran
+        _release_lease(coalesce.complete, coalesce_key, job_id, result)
 
 @app.route("/api/analyze", methods=["POST"])
 def analyze():
@@ -32,8 +72,31 @@ def analyze():
         return jsonify({"error": "Invalid or missing URL"}), 400
 
     job_id = str(uuid.uuid4())
-    _job_store[job_id] = {"status": "running", "created_at": time.time()}
-    thread = threading.Thread(target=_background_job, args=(job_id, url), daemon=True)
+    job = {"status": "running", "created_at": time.time()}
+
+    # Single-flight: identical URLs share one in-flight (or just-finished) analysis
+    key = coalesce.coalesce_key(url)
+    try:
+        role, leader_job_id = coalesce.acquire(key, job_id)
+    except Exception as e:
+        print(f"Coalescing unavailable, running uncoalesced: {e}")
+        role, leader_job_id, key = coalesce.LEADER, job_id, None
+
+    if role == coalesce.REUSE:
+        # From the primary: a lagging secondary may not have the leader's result yet
+        state = get_result(leader_job_id, primary=True)
+        if state is not None:
+            save_result(job_id, state, run_id=leader_job_id)
+            _job_store[job_id] = {**job, "status": "complete", "reused_from": leader_job_id}
+            return jsonify({"job_id": job_id, "status": "complete"}), 202
+        # The reused result vanished; run it ourselves without touching the lease
+        key = None
+    elif role == coalesce.FOLLOWER:
+        _job_store[job_id] = {**job, "coalesce_key": key, "follows": leader_job_id}
+        return jsonify({"job_id": job_id, "status": "running"}), 202
+
+    _job_store[job_id] = job
+    thread = threading.Thread(target=_background_job, args=(job_id, url, key), daemon=True)
     thread.start()
 
     return jsonify({"job_id": job_id, "status": "running"}), 202
@@ -43,6 +106,14 @@ def get_result_endpoint(job_id):
     job = _job_store.get(job_id)
     if not job:
         return jsonify({"error": "job not found"}), 404
+    if job["status"] == "running" and job.get("follows"):
+        # The leader may be in another worker; its lease/result in Mongo is the source of truth
+        try:
+            job["status"], job["error"] = coalesce.follower_status(job["coalesce_key"], job["follows"], job_id)
+        except Exception as e:
+            # Likely transient: keep reporting "running" so the client polls again
+            print(f"Coalesced job lookup failed: {e}")
+            return jsonify({"status": "running", "error": None}), 200
     if job["status"] != "complete":
         return jsonify({"status": job["status"], "error": job.get("error")}), 200
     result = get_result(job_id)
@@ -67,5 +138,49 @@ def chat():
     answer = chat_with_brief(state, message)
     return jsonify({"answer": answer}), 200
 
+@app.route("/api/export", methods=["GET"])
+def export_results():
+    """
+    Stream completed analyses: ?format=ndjson|parquet&since=YYYY-MM-DD&until=YYYY-MM-DD&domain=example.com
+    `since` is inclusive and `until` exclusive (UTC). Rows are read with a
+    batched cursor and streamed, so memory stays flat.
+    """
+    fmt = request.args.get("format", "ndjson").lower()
+    try:
+        since = export.parse_date(request.args.get("since"))
+        until = export.parse_date(request.args.get("until"))
+    except ValueError:
+        return jsonify({"error": "since/until must be ISO dates"}), 400
+
+    stats = export.ExportStats()
+    rows = export.iter_rows(since, until, request.args.get("domain"), stats=stats)
+    try:
+        chunks = export.export_chunks(fmt, rows)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 501
+
+    def generate():
+        yield from chunks
+        print(f"[EXPORT] {fmt}: {stats}")
+
+    filename = f"results.{fmt}"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=export.CONTENT_TYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+@app.route("/api/db/pool", methods=["GET"])
+def db_pool_stats():
+    """Connection pool settings and live counters from db.pool_stats()."""
+    return jsonify(pool_stats()), 200
+
+@app.route("/api/llm/stats", methods=["GET"])
+def llm_stats():
+    """Per-model-tier latency percentiles, hedges and fallbacks from llm_client.latency_stats()."""
+    return jsonify(latency_stats()), 200
+
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
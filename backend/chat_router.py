@@ -0,0 +1,226 @@
+# chat_router.py
+"""
+Structured fast path for follow-up chat questions.
+
+Most chat messages are field lookups ("what's the price?", "how many baths?")
+or simple comparisons ("does the sqft match the official record?") whose
+answers are already typed fields in the stored state. `answer_structured`
+answers those directly, citing the source section, and returns None for
+anything open-ended so the caller can fall back to Gemini.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+WEB_SOURCE = "Live Web Listing"
+OFFICIAL_SOURCE = "OFFICIAL RECORD"
+
+# field -> (noun phrases that name it as the subject of a question, label)
+FIELD_NOUNS: Dict[str, Tuple[str, str]] = {
+    "price": (r"(?:(?:asking|listing|listed|monthly) )?(?:price|rent)", "Price"),
+    "beds": (r"(?:number of )?(?:beds|bedrooms)", "Beds"),
+    "baths": (r"(?:number of )?(?:baths|bathrooms)", "Baths"),
+    "sqft": (r"sqft|sq ft|square feet|square footage|(?<!lot )size", "Sqft"),
+    "year_built": (r"year built", "Year built"),
+    "lot_sqft": (r"lot size", "Lot size"),
+    "address": (r"address", "Address"),
+    "agent": (r"(?:listing )?(?:agent|broker)(?:'s name| name)?(?!'s phone| phone)", "Agent"),
+    "agent_phone": (r"(?:listing )?(?:agent|broker)(?:'s)? phone(?: number)?", "Agent phone"),
+}
+# Composite fields: sub-fields shown for lookups and compared individually
+COMPOSITE_FIELDS = {
+    "address": ("line1", "city", "state", "zip"),
+    "agent": ("name", "phone"),
+}
+
+_FIELD = "|".join(f"(?:{noun})" for noun, _ in FIELD_NOUNS.values())
+# One or more fields, e.g. "beds and baths", "price, beds and sqft"
+_FIELDS = rf"(?P<fields>(?:{_FIELD})(?:(?:,| and|, and) (?:the )?(?:{_FIELD}))*)"
+_UNIT = r"(?:it|the (?:unit|place|home|house|apartment|property|listing))"
+_SOURCE = r"(?: (?:on|in|per|according to|from) (?:the )?(?:official record|tax record|record|listing|website))?"
+_RECORD = r"(?: (?:the )?(?:official record|tax record|record|records|listing))?"
+
+# A question is only answered from state when the whole message has one of
+# these shapes with the field as its subject; anything else goes to the model.
+LOOKUP_TEMPLATES = [
+    re.compile(rf"(?:what(?:'s| is| are)|whats|who(?:'s| is)|tell me) (?:the )?(?:official |listed )?{_FIELDS}(?: (?:of|for) {_UNIT})?{_SOURCE}"),
+    re.compile(rf"what (?:is|are) (?:the )?(?:official |listed )?{_FIELDS}{_SOURCE}"),
+    re.compile(rf"what {_FIELDS} (?:is|are) (?:listed |shown )?(?:on|in) (?:the )?(?:official record|tax record|record|listing|website)"),
+    re.compile(rf"how many (?P<fields>(?:beds|bedrooms|baths|bathrooms)(?: and (?:beds|bedrooms|baths|bathrooms))?)"
+               rf"(?: (?:does|do) {_UNIT} have| are there| (?:is|are) (?:it|listed))?{_SOURCE}"),
+    re.compile(rf"{_FIELDS}{_SOURCE}"),
+]
+# Shapes that map straight to one field without naming it
+FIXED_LOOKUPS = [
+    (re.compile(rf"how much (?:is {_UNIT}|is the (?:rent|price)|does {_UNIT} cost){_SOURCE}"), "price"),
+    (re.compile(rf"how (?:big|large) is {_UNIT}|how many square feet(?: is {_UNIT})?{_SOURCE}"), "sqft"),
+    (re.compile(rf"(?:when was|what year was) {_UNIT} built{_SOURCE}"), "year_built"),
+    (re.compile(rf"where is {_UNIT}(?: located)?"), "address"),
+]
+COMPARE_TEMPLATES = [
+    re.compile(rf"(?:does|do|is|are) (?:the )?(?:listed )?{_FIELDS} "
+               rf"(?:match|agree with|consistent|correct|accurate|the same|different)"
+               rf"(?: (?:with|as|from|to))?{_RECORD}"),
+    re.compile(rf"(?:compare|check) (?:the )?{_FIELDS}(?: (?:with|to|against){_RECORD})?"),
+    re.compile(rf"(?:is there |are there )?(?:any |a )?(?:discrepancy|discrepancies|mismatch|mismatches) (?:in|for|on) (?:the )?{_FIELDS}"),
+]
+_OFFICIAL_HINT = re.compile(r"\b(official|record|records|tax)\b")
+
+def _find_source(state: Dict[str, Any], source: str) -> Optional[Dict[str, Any]]:
+    for item in state.get("raw_data", []):
+        if item.get("source") == source:
+            data = item.get("data")
+            # "No matching records found." is stored as a plain string
+            return data if isinstance(data, dict) else None
+    return None
+
+
+def _get_parts(record: Optional[Dict[str, Any]], field: str) -> Dict[str, Any]:
+    """Non-empty sub-fields of a composite field (address, agent)."""
+    value = (record or {}).get(field)
+    if not isinstance(value, dict):
+        return {}
+    return {k: value[k] for k in COMPOSITE_FIELDS[field] if value.get(k)}
+
+
+def _get_field(record: Optional[Dict[str, Any]], field: str) -> Any:
+    """
+    Read a field from either a normalized web listing (flat) or an official
+    record (numeric fields nested under "listing").
+    """
+    if not record:
+        return None
+    if field in COMPOSITE_FIELDS:
+        parts = _get_parts(record, field)
+        separator = ", " if field == "address" else " / "
+        return separator.join(str(p) for p in parts.values()) or None
+    if field == "agent_phone":
+        return _get_parts(record, "agent").get("phone")
+    nested = record.get("listing")
+    if isinstance(nested, dict) and nested.get(field) is not None:
+        return nested[field]
+    return record.get(field)
+
+
+def _format_value(field: str, value: Any) -> str:
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if field == "price" and isinstance(value, (int, float)):
+        return f"${value:,}"
+    if field in ("sqft", "lot_sqft") and isinstance(value, (int, float)):
+        return f"{value:,} sqft"
+    return str(value)
+
+
+def _same(a: Any, b: Any) -> bool:
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return float(a) == float(b)
+    return str(a).strip().lower() == str(b).strip().lower()
+
+
+def _normalize(message: str) -> str:
+    text = (message or "").lower().replace("\u2019", "'")
+    text = re.sub(r"[?!.]+$", "", text.strip())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def detect_fields(fields_text: str) -> List[str]:
+    """Fields named in the matched noun list, in FIELD_NOUNS order."""
+    return [field for field, (noun, _) in FIELD_NOUNS.items()
+            if re.search(rf"(?:^|\W)(?:{noun})(?:$|\W)", fields_text)]
+
+
+def _match(templates, text: str) -> Optional[List[str]]:
+    for template in templates:
+        m = template.fullmatch(text)
+        if m:
+            return detect_fields(m.group("fields"))
+    return None
+
+
+def answer_structured(state: Dict[str, Any], message: str) -> Optional[str]:
+    """
+    Answer a field lookup or comparison from stored state, or return None
+    when the question should go to the LLM.
+    """
+    text = _normalize(message)
+    if not text:
+        return None
+
+    web = _find_source(state, WEB_SOURCE)
+    official = _find_source(state, OFFICIAL_SOURCE)
+
+    fields = _match(COMPARE_TEMPLATES, text)
+    if fields:
+        return _answer_comparison(fields, web, official)
+
+    fields = _match(LOOKUP_TEMPLATES, text)
+    if not fields:
+        fields = [field for pattern, field in FIXED_LOOKUPS if pattern.fullmatch(text)][:1]
+    if not fields:
+        return None
+    return _answer_lookup(fields, web, official, prefer_official=bool(_OFFICIAL_HINT.search(text)))
+
+
+def _answer_lookup(fields, web, official, prefer_official=False) -> Optional[str]:
+    order = [(OFFICIAL_SOURCE, official), (WEB_SOURCE, web)]
+    if not prefer_official:
+        order.reverse()
+
+    lines = []
+    for field in fields:
+        label = FIELD_NOUNS[field][1]
+        candidates = order
+        if field == "agent_phone":
+            # Only the phone of the agent we'd name; another source's agent may be someone else
+            candidates = [(s, r) for s, r in order if _get_parts(r, "agent").get("name")][:1]
+        for source, record in candidates:
+            value = _get_field(record, field)
+            if value is not None:
+                lines.append(f"{label}: {_format_value(field, value)} [source: {source}]")
+                break
+        else:
+            # A field we can't resolve deterministically; let the model handle it
+            return None
+    return "\n".join(lines)
+
+
+def _compare_values(field: str, web: Optional[Dict[str, Any]], official: Optional[Dict[str, Any]]):
+    """
+    (listed, recorded, same) for a field, or None when the sources don't both
+    have it. Composite fields only compare the sub-fields both sources have,
+    so a missing zip is not reported as a mismatch.
+    """
+    if field in COMPOSITE_FIELDS:
+        web_parts, official_parts = _get_parts(web, field), _get_parts(official, field)
+        shared = [k for k in COMPOSITE_FIELDS[field] if k in web_parts and k in official_parts]
+        if not shared:
+            return None
+        listed = ", ".join(str(web_parts[k]) for k in shared)
+        recorded = ", ".join(str(official_parts[k]) for k in shared)
+        return listed, recorded, all(_same(web_parts[k], official_parts[k]) for k in shared)
+
+    web_value = _get_field(web, field)
+    official_value = _get_field(official, field)
+    if web_value is None or official_value is None:
+        return None
+    return _format_value(field, web_value), _format_value(field, official_value), _same(web_value, official_value)
+
+
+def _answer_comparison(fields, web, official) -> Optional[str]:
+    lines = []
+    for field in fields:
+        label = FIELD_NOUNS[field][1]
+        compared = _compare_values(field, web, official)
+        if compared is None:
+            return None
+        listed, recorded, same = compared
+        if same:
+            lines.append(
+                f"{label} matches: {listed} [source: {WEB_SOURCE}] vs {recorded} [source: {OFFICIAL_SOURCE}]"
+            )
+        else:
+            lines.append(
+                f"{label} differs: listing says {listed} [source: {WEB_SOURCE}], "
+                f"official record says {recorded} [source: {OFFICIAL_SOURCE}]"
+            )
+    return "\n".join(lines)
@@ -0,0 +1,155 @@
+# coalesce.py
+"""
+Single-flight coalescing for /api/analyze.
+
+Requests are keyed on `normalize_url(url)`. The first request for a key takes
+a lease in `property_db.analysis_leases` and runs the workflow (the leader);
+requests arriving while that lease is live attach to it as followers, and the
+leader fans its result out to every follower job_id when it finishes. For
+REUSE_WINDOW_SECONDS after completion, new requests reuse the finished result
+instead of re-running the scrape and Gemini calls. Because the lease lives in
+Mongo, this works across worker processes.
+
+Lease document:
+  {_id: key, job_id: leader job, status: "running" | "complete" | "failed",
+   expires_at, completed_at, followers: [job_id, ...], error}
+
+Settings (environment variables):
+  ANALYZE_LEASE_SECONDS          how long a leader may run before others may take over (default: 300)
+  ANALYZE_REUSE_WINDOW_SECONDS   how long a completed result is reused (default: 60; 0 disables)
+"""
+import os
+import time
+
+import db
+from scraper import normalize_url
+
+LEADER = "leader"
+FOLLOWER = "follower"
+REUSE = "reuse"
+
+# Attempts to settle a race with another process for the same key
+MAX_ACQUIRE_ATTEMPTS = 3
+
+
+def lease_seconds():
+    return float(os.getenv("ANALYZE_LEASE_SECONDS", "300"))
+
+
+def reuse_window_seconds():
+    return float(os.getenv("ANALYZE_REUSE_WINDOW_SECONDS", "60"))
+
+
+def coalesce_key(url):
+    return normalize_url(url) or url
+
+
+def acquire(key, job_id, now=None):
+    """
+    Decide how `job_id` should be served.
+
+    Returns (LEADER, job_id) if the caller must run the workflow, (FOLLOWER,
+    leader_job_id) if it attached to an in-flight run, or (REUSE,
+    leader_job_id) if a result completed within the reuse window.
+    """
+    from pymongo import ReturnDocument
+    from pymongo.errors import DuplicateKeyError
+
+    leases = db.analysis_leases()
+    for _ in range(MAX_ACQUIRE_ATTEMPTS):
+        now = time.time() if now is None else now
+        fresh = {
+            "job_id": job_id,
+            "status": "running",
+            "expires_at": now + lease_seconds(),
+            "completed_at": None,
+            "followers": [],
+            "error": None,
+        }
+        try:
+            leases.insert_one({"_id": key, **fresh})
+            return LEADER, job_id
+        except DuplicateKeyError:
+            pass
+
+        # 1. Attach to a live run
+        doc = leases.find_one_and_update(
+            {"_id": key, "status": "running", "expires_at": {"$gt": now}},
+            {"$addToSet": {"followers": job_id}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc:
+            return FOLLOWER, doc["job_id"]
+
+        # 2. Reuse a just-completed result
+        doc = leases.find_one(
+            {"_id": key, "status": "complete", "completed_at": {"$gte": now - reuse_window_seconds()}}
+        )
+        if doc:
+            return REUSE, doc["job_id"]
+
+        # 3. Take over a failed, stale or abandoned (lease expired) run
+        doc = leases.find_one_and_update(
+            {"_id": key, "$or": [
+                {"status": "failed"},
+                {"status": "running", "expires_at": {"$lte": now}},
+                {"status": "complete", "completed_at": {"$lt": now - reuse_window_seconds()}},
+            ]},
+            {"$set": fresh},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc:
+            return LEADER, job_id
+        # Another process changed the lease between our reads; look again
+        now = None
+
+    # Still contended: run uncoalesced rather than fail the request
+    return LEADER, job_id
+
+
+def complete(key, job_id, state):
+    """
+    Leader finished: mark the lease complete and fan `state` out to every
+    follower job_id. Returns the follower job_ids.
+    """
+    doc = db.analysis_leases().find_one_and_update(
+        {"_id": key, "job_id": job_id},
+        {"$set": {"status": "complete", "completed_at": time.time()}},
+    )
+    followers = doc.get("followers", []) if doc else []
+    for follower_id in followers:
+        db.save_result(follower_id, state, run_id=job_id)
+    return followers
+
+
+def fail(key, job_id, error):
+    db.analysis_leases().update_one(
+        {"_id": key, "job_id": job_id},
+        {"$set": {"status": "failed", "error": error}},
+    )
+
+
+def follower_status(key, leader_job_id, job_id):
+    """
+    Resolve a follower's status as (status, error). Works from any process:
+    followers whose result hasn't been fanned out yet copy the leader's.
+    """
+    # Results are read from the primary, like the lease: with secondary reads a
+    # follower could see the lease complete before the leader's result replicates
+    if db.get_result(job_id, primary=True) is not None:
+        return "complete", None
+
+    doc = db.analysis_leases().find_one({"_id": key})
+    if not doc or doc["job_id"] != leader_job_id:
+        return "failed", "coalesced analysis was superseded"
+    if doc["status"] == "complete":
+        state = db.get_result(leader_job_id, primary=True)
+        if state is None:
+            return "failed", "coalesced analysis result is missing"
+        db.save_result(job_id, state, run_id=leader_job_id)
+        return "complete", None
+    if doc["status"] == "failed":
+        return "failed", doc.get("error")
+    if doc["expires_at"] <= time.time():
+        return "failed", "coalesced analysis lease expired"
+    return "running", None
@@ -0,0 +1,21 @@
+# config.py
+"""
+Environment loading shared by the backend modules.
+
+`.env` is read once, on first use, instead of at import time in every module
+so that importing the agent (or running a script) stays cheap.
+"""
+from functools import lru_cache
+from pathlib import Path
+
+ENV_PATH = Path(__file__).resolve().parent.parent / ".env"
+
+
+@lru_cache(maxsize=None)
+def load_env() -> bool:
+    """Load `.env` into os.environ (existing variables win). Safe to call repeatedly."""
+    from dotenv import load_dotenv
+
+    # Repo-root .env first, then dotenv's usual lookup from the working directory
+    loaded = load_dotenv(ENV_PATH) if ENV_PATH.exists() else False
+    return load_dotenv() or loaded
@@ -1,23 +1,316 @@
 # db.py
+"""
+Data-access layer for property_db.
+
+Every Mongo call in the backend (agent, app, coalesce, listing_stats,
+scripts/seed.py) goes through this module so pool sizing, timeouts and read
+routing are configured in one place. Both a sync (MongoClient) and an async
+(pymongo AsyncMongoClient) client are built from the same settings and share
+the pool statistics. The async API is deliberately limited to the
+per-request operations (canonical lookup, save/get result); bulk and
+maintenance work (listing upserts, stats, exports, leases) is sync only.
+
+Settings (environment variables):
+  MONGO_URI                          connection string
+  MONGO_DB                           database name (default: property_db)
+  MONGO_MAX_POOL_SIZE                max connections per server (default: 50)
+  MONGO_MIN_POOL_SIZE                warm connections kept open (default: 0)
+  MONGO_WAIT_QUEUE_TIMEOUT_MS        max wait for a free connection (default: 2000)
+  MONGO_SERVER_SELECTION_TIMEOUT_MS  (default: 5000)
+  MONGO_READ_PREFERENCE              read preference for lookups/result fetches, e.g.
+                                     "secondaryPreferred" (default: primary). Secondary
+                                     reads may briefly lag the primary.
+"""
 import os
-from pymongo import MongoClient
+import re
+import threading
+from config import load_env
+
+DEFAULT_DB_NAME = "property_db"
 
 _mongo_client = None
+_async_mongo_client = None
+_client_lock = threading.Lock()
+
+# client kind ("sync" / "async") -> connection pool counters
+_pool_stats = {}
+# client kind -> options the live client was actually built with
+_client_options = {}
+_pool_stats_lock = threading.Lock()
+
+
+def client_options():
+    """
+    Pool/timeout settings passed to both clients. Read on each call so tests
+    and scripts can override the environment before the first connection.
+    """
+    load_env()
+    return {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    }
+
+
+def _db_name():
+    return os.getenv("MONGO_DB", DEFAULT_DB_NAME)
+
+
+def _read_preference_name():
+    return os.getenv("MONGO_READ_PREFERENCE", "primary")
+
+
+def _read_preference(kind):
+    """
+    ReadPreference used for read-only lookups (canonical records, results),
+    fixed when the `kind` client was built. Writes always go to the primary.
+    """
+    from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
+
+    name = _client_options.get(kind, {}).get("read_preference") or _read_preference_name()
+    return make_read_preference(read_pref_mode_from_name(name), None)
+
+
+def _pool_listener(kind):
+    """
+    Build a ConnectionPoolListener that tallies pool events for `kind`.
+    The class is created here so pymongo is only imported on first connection.
+    """
+    from pymongo.monitoring import ConnectionPoolListener
+
+    with _pool_stats_lock:
+        stats = _pool_stats.setdefault(kind, {
+            "pools": 0,
+            "connections_open": 0,
+            "connections_in_use": 0,
+            "connections_created": 0,
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "pool_clears": 0,
+        })
+
+    def bump(key, delta=1):
+        with _pool_stats_lock:
+            stats[key] += delta
+
+    class _Listener(ConnectionPoolListener):
+        def pool_created(self, event):
+            bump("pools")
+
+        def pool_ready(self, event):
+            pass
+
+        def pool_cleared(self, event):
+            bump("pool_clears")
+
+        def pool_closed(self, event):
+            bump("pools", -1)
+
+        def connection_created(self, event):
+            bump("connections_created")
+            bump("connections_open")
+
+        def connection_ready(self, event):
+            pass
+
+        def connection_closed(self, event):
+            bump("connections_open", -1)
+
+        def connection_check_out_started(self, event):
+            pass
+
+        def connection_check_out_failed(self, event):
+            bump("checkout_failures")
+
+        def connection_checked_out(self, event):
+            bump("checkouts")
+            bump("connections_in_use")
+
+        def connection_checked_in(self, event):
+            bump("connections_in_use", -1)
+
+    return _Listener()
+
 
 def get_db_client():
     global _mongo_client
     if _mongo_client is None:
-        _mongo_client = MongoClient(os.getenv("MONGO_URI"), serverSelectionTimeoutMS=5000)
+        with _client_lock:
+            if _mongo_client is None:
+                # pymongo is imported on first use to keep module import cheap
+                from pymongo import MongoClient
+                options = client_options()
+                _client_options["sync"] = {**options, "read_preference": _read_preference_name()}
+                _mongo_client = MongoClient(
+                    os.getenv("MONGO_URI"), event_listeners=[_pool_listener("sync")], **options
+                )
     return _mongo_client
 
+
+def get_async_db_client():
+    """
+    Async counterpart of get_db_client(). The client must be used from a
+    single event loop.
+    """
+    global _async_mongo_client
+    if _async_mongo_client is None:
+        with _client_lock:
+            if _async_mongo_client is None:
+                from pymongo import AsyncMongoClient
+                options = client_options()
+                _client_options["async"] = {**options, "read_preference": _read_preference_name()}
+                _async_mongo_client = AsyncMongoClient(
+                    os.getenv("MONGO_URI"), event_listeners=[_pool_listener("async")], **options
+                )
+    return _async_mongo_client
+
+
+def get_database():
+    return get_db_client()[_db_name()]
+
+
+def get_async_database():
+    return get_async_db_client()[_db_name()]
+
+
+def _read_collection(database, name, kind="sync"):
+    return database.get_collection(name, read_preference=_read_preference(kind))
+
+
+def pool_stats():
+    """
+    For each client that has been created: the pool options it was built
+    with plus its live connection counters.
+    """
+    with _pool_stats_lock:
+        return {
+            kind: {"options": dict(_client_options.get(kind, {})), **stats}
+            for kind, stats in _pool_stats.items()
+        }
+
+
+# --- Listings (ground truth) ---
+def _canonical_query(address_text):
+    # Use first 15 chars for fuzzy match; escape so addresses like "3310-3316 (Rear)" stay literal
+    search_term = re.escape(address_text[:15])
+    return {"address.line1": {"$regex": search_term, "$options": "i"}}
+
+
+def find_canonical_by_address(address_text):
+    if not address_text:
+        return None
+    return _read_collection(get_database(), "listings").find_one(_canonical_query(address_text))
+
+
+async def async_find_canonical_by_address(address_text):
+    if not address_text:
+        return None
+    return await _read_collection(get_async_database(), "listings", "async").find_one(_canonical_query(address_text))
+
+
+def ensure_listing_indexes():
+    db = get_database()
+    db.listings.create_index("property_id", unique=True)
+    db.listings.create_index("source_url")
+    db.listings.create_index([("address.city", 1), ("address.zip", 1)])
+
+
+def upsert_listing(doc):
+    """
+    Upsert a listing by property_id and return the previous version (None if new),
+    so callers can maintain derived data such as listing_stats incrementally.
+    """
+    from pymongo import ReturnDocument
+
+    return get_database().listings.find_one_and_update(
+        {"property_id": doc["property_id"]}, {"$set": doc},
+        upsert=True, return_document=ReturnDocument.BEFORE,
+    )
+
+
+def iter_listings():
+    """Every ground-truth listing (without _id)."""
+    return get_database().listings.find({}, {"_id": 0})
+
+
+# --- Listing stats (materialized by listing_stats.py) ---
+def find_listing_stats(stat_ids):
+    """One _id lookup for several stats rows."""
+    return list(_read_collection(get_database(), "listing_stats").find({"_id": {"$in": list(stat_ids)}}))
+
+
+def update_listing_stats(stat_id, update):
+    get_database().listing_stats.update_one({"_id": stat_id}, update, upsert=True)
+
+
+def clear_listing_stats():
+    get_database().listing_stats.delete_many({})
+
+
+# --- Analysis leases (coalesce.py) ---
+def analysis_leases():
+    """
+    The lease collection. Always read from the primary: lease state decides
+    who runs an analysis, so a lagging secondary must never answer.
+    """
+    return get_database().analysis_leases
+
+
+# --- Results ---
 # For demo: store results in a collection keyed by job_id
-def save_result(job_id, state):
-    client = get_db_client()
-    db = client.property_db
-    db.results.replace_one({"job_id": job_id}, {"job_id": job_id, "state": state}, upsert=True)
-
-def get_result(job_id):
-    client = get_db_client()
-    db = client.property_db
-    doc = db.results.find_one({"job_id": job_id})
+def save_result(job_id, state, run_id=None):
+    """
+    Store `state` under `job_id`. `run_id` is the job whose workflow run
+    produced it (default: `job_id`); coalesced followers and reused results
+    share their leader's, so one analysis can be told apart from its copies.
+    """
+    get_database().results.replace_one(
+        {"job_id": job_id}, {"job_id": job_id, "run_id": run_id or job_id, "state": state}, upsert=True
+    )
+
+
+def get_result(job_id, primary=False):
+    """
+    Saved state for `job_id`. `primary=True` skips the configured read
+    preference, for reads that must see a write made moments ago elsewhere
+    (e.g. a coalesced leader's result once its lease says complete).
+    """
+    database = get_database()
+    results = database.results if primary else _read_collection(database, "results")
+    doc = results.find_one({"job_id": job_id})
+    return doc["state"] if doc else None
+
+
+def iter_results(start=None, end=None, domain=None, batch_size=1000):
+    """
+    Server-side cursor over saved results, oldest first, fetched `batch_size`
+    documents at a time. `start`/`end` (datetimes) filter on the ObjectId
+    creation time, so no extra field or index is needed; `domain` matches the
+    host of the analyzed URL (www. optional).
+    """
+    from bson import ObjectId
+
+    query = {}
+    id_range = {}
+    if start is not None:
+        id_range["$gte"] = ObjectId.from_datetime(start)
+    if end is not None:
+        id_range["$lt"] = ObjectId.from_datetime(end)
+    if id_range:
+        query["_id"] = id_range
+    if domain:
+        host = re.escape(domain.lower().removeprefix("www."))
+        query["state.address"] = {"$regex": rf"^https?://(www\.)?{host}(:|/|$)", "$options": "i"}
+    return _read_collection(get_database(), "results").find(query).sort("_id", 1).batch_size(batch_size)
+
+
+async def async_save_result(job_id, state, run_id=None):
+    await get_async_database().results.replace_one(
+        {"job_id": job_id}, {"job_id": job_id, "run_id": run_id or job_id, "state": state}, upsert=True
+    )
+
+
+async def async_get_result(job_id):
+    doc = await _read_collection(get_async_database(), "results", "async").find_one({"job_id": job_id})
     return doc["state"] if doc else None
@@ -0,0 +1,216 @@
+# export.py
+"""
+Streaming bulk export of analysis results (property_db.results).
+
+Results are read through a batched server-side cursor (db.iter_results),
+flattened one at a time and encoded into NDJSON lines or Parquet row groups,
+so memory stays constant no matter how many results are exported. Both
+encoders yield bytes chunks, which the /api/export endpoint streams and
+scripts/export_results.py writes to a file.
+
+Coalesced and reused requests store a copy of their leader's state under
+their own job_id, so one analysis can appear as several rows; `run_id` is the
+same on all of them (the job that actually ran the workflow). Count distinct
+run_ids, not rows, to count analyses.
+
+Parquet needs the optional `pyarrow` package; it is imported only when a
+Parquet export is requested.
+"""
+import importlib.util
+import json
+import time
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, Optional
+from urllib.parse import urlparse
+
+import db
+
+FORMATS = ("ndjson", "parquet")
+CONTENT_TYPES = {"ndjson": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+
+# Rows per NDJSON chunk / Parquet row group
+CHUNK_ROWS = 1000
+ROW_GROUP_ROWS = 10000
+
+# Flattened column -> Parquet type name
+COLUMNS = {
+    "job_id": "string",
+    "run_id": "string",
+    "created_at": "timestamp",
+    "url": "string",
+    "domain": "string",
+    "address": "string",
+    "city": "string",
+    "state": "string",
+    "zip": "string",
+    "price": "float64",
+    "beds": "float64",
+    "baths": "float64",
+    "sqft": "float64",
+    "discrepancies": "string",
+    "summary": "string",
+}
+
+
+class ExportStats:
+    """Row count and throughput of a running export."""
+
+    def __init__(self):
+        self.rows = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        return f"{self.rows} rows in {self.elapsed:.2f}s ({self.rows_per_second:,.0f} rows/s)"
+
+
+def parse_date(text: Optional[str]) -> Optional[datetime]:
+    """ISO date or datetime ("2026-01-31", "2026-01-31T12:00:00Z"); naive values are UTC."""
+    if not text:
+        return None
+    parsed = datetime.fromisoformat(text.strip().replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _as_text(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, default=str)
+
+
+def _as_number(value: Any) -> Optional[float]:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def flatten_result(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    One flat row per result: the live listing's typed fields plus the
+    discrepancies and summary text.
+    """
+    state = doc.get("state") or {}
+    listing = {}
+    for item in state.get("raw_data", []):
+        if item.get("source") == "Live Web Listing" and isinstance(item.get("data"), dict):
+            listing = item["data"]
+            break
+    address = listing.get("address") or {}
+    url = state.get("address")
+    oid = doc.get("_id")
+
+    return {
+        "job_id": doc.get("job_id"),
+        # Results saved before run_id existed were always their own run
+        "run_id": doc.get("run_id") or doc.get("job_id"),
+        "created_at": oid.generation_time if hasattr(oid, "generation_time") else None,
+        "url": url,
+        "domain": urlparse(url).netloc.lower() if url else None,
+        "address": address.get("line1"),
+        "city": address.get("city"),
+        "state": address.get("state"),
+        "zip": address.get("zip"),
+        "price": _as_number(listing.get("price")),
+        "beds": _as_number(listing.get("beds")),
+        "baths": _as_number(listing.get("baths")),
+        "sqft": _as_number(listing.get("sqft")),
+        "discrepancies": _as_text(state.get("discrepancies")),
+        "summary": _as_text(state.get("summary")),
+    }
+
+
+def iter_rows(start=None, end=None, domain=None, stats: Optional[ExportStats] = None,
+              batch_size: int = CHUNK_ROWS) -> Iterator[Dict[str, Any]]:
+    for doc in db.iter_results(start, end, domain, batch_size=batch_size):
+        if stats is not None:
+            stats.rows += 1
+        yield flatten_result(doc)
+
+
+def _batches(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[list]:
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def ndjson_chunks(rows: Iterable[Dict[str, Any]], chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    for batch in _batches(rows, chunk_rows):
+        lines = [json.dumps(row, default=lambda v: v.isoformat()) for row in batch]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _ChunkSink:
+    """
+    Write-only file object for pyarrow that hands bytes back to the caller
+    as they are produced instead of keeping the whole file.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_schema():
+    import pyarrow as pa
+
+    types = {"string": pa.string(), "float64": pa.float64(), "timestamp": pa.timestamp("ms", tz="UTC")}
+    return pa.schema([(name, types[kind]) for name, kind in COLUMNS.items()])
+
+
+def parquet_chunks(rows: Iterable[Dict[str, Any]], row_group_rows: int = ROW_GROUP_ROWS) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for batch in _batches(rows, row_group_rows):
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_chunks(fmt: str, rows: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    if fmt == "ndjson":
+        return ndjson_chunks(rows)
+    if fmt == "parquet":
+        # Fail before any bytes are streamed, not on the first chunk
+        if importlib.util.find_spec("pyarrow") is None:
+            raise RuntimeError("Parquet export requires the 'pyarrow' package")
+        return parquet_chunks(rows)
+    raise ValueError(f"Unsupported export format: {fmt} (expected one of {', '.join(FORMATS)})")
@@ -0,0 +1,267 @@
+# listing_stats.py
+"""
+Materialized neighborhood price statistics over property_db.listings.
+
+`property_db.listing_stats` holds one row per scope -- zip, zip+beds, city and
+city+beds, each split by listing type (monthly rent vs sale price, which
+differ by orders of magnitude) -- with the listing count and bounded histograms of price and
+price-per-sqft. Histogram buckets are logarithmic (each BUCKET_GROWTH wider
+than the last), so a row has at most a few hundred buckets however many
+listings it covers, and percentiles read from it are within about 1%.
+
+Rows are maintained incrementally: `upsert_listing` (used by scripts/seed.py;
+any other loader of ground-truth listings should go through it too) applies
+the difference between the listing's previous and new version as atomic
+`$inc`s on the rows it touches -- nothing is read back on write. The workflow
+reads the relevant rows with a single `_id` lookup (`neighborhood_stats`) and
+derives p10/p25/median/p75/p90 from the histograms.
+
+Row document:
+  {_id: "type=rent|city=CHAMPAIGN|beds=2", scope: {"type": ..., "city": ..., "beds": ...},
+   count, ppsf_count, price_hist: {bucket: n}, ppsf_hist: {bucket: n}, updated_at}
+
+For an existing database (or after changing SCOPES), run
+`rebuild_listing_stats()` once to backfill.
+"""
+import math
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import db
+
+# Most specific first; the workflow uses the first row with enough listings
+SCOPES = (("type", "zip", "beds"), ("type", "zip"), ("type", "city", "beds"), ("type", "city"))
+MIN_STATS_SAMPLES = 5
+# Quartiles of fewer listings are just individual listings; don't fence on them
+MIN_FENCE_SAMPLES = 20
+# Listings without an explicit listing_type are classed by price: anything
+# below this is a monthly rent (scraped prices are rents, see normalize.parse_price)
+RENT_PRICE_CEILING = 20000
+PERCENTILES = (("p10", 0.10), ("p25", 0.25), ("median", 0.50), ("p75", 0.75), ("p90", 0.90))
+# Relative width of a histogram bucket (2% -> percentiles within ~1%)
+BUCKET_GROWTH = 0.02
+HISTOGRAMS = (("price", "price_hist", "count"), ("ppsf", "ppsf_hist", "ppsf_count"))
+
+
+def _listing_values(listing: Dict[str, Any]) -> Dict[str, Any]:
+    # Canonical records nest numbers under "listing"; normalized scrapes are flat
+    nested = listing.get("listing")
+    return nested if isinstance(nested, dict) else listing
+
+
+def listing_type(listing: Dict[str, Any]) -> Optional[str]:
+    """"rent" or "sale" (None without a price)."""
+    values = _listing_values(listing)
+    explicit = listing.get("listing_type") or values.get("listing_type")
+    if explicit in ("rent", "sale"):
+        return explicit
+    price = values.get("price")
+    if not isinstance(price, (int, float)) or price <= 0:
+        return None
+    return "rent" if price < RENT_PRICE_CEILING else "sale"
+
+
+def _scope_values(address: Optional[Dict[str, Any]], beds: Any, kind: Optional[str]) -> Dict[str, str]:
+    address = address or {}
+    values = {"type": kind} if kind else {}
+    zip_code = str(address.get("zip") or "").strip()[:5]
+    if zip_code:
+        values["zip"] = zip_code
+    city = str(address.get("city") or "").strip().upper()
+    if city:
+        values["city"] = city
+    if isinstance(beds, (int, float)):
+        values["beds"] = str(int(beds)) if float(beds).is_integer() else str(beds)
+    return values
+
+
+def stat_scopes(address: Optional[Dict[str, Any]], beds: Any, kind: Optional[str]) -> List[Tuple[str, Dict[str, str]]]:
+    """
+    (_id, scope) for every scope a `kind` ("rent"/"sale") listing at this
+    location falls into, most specific first.
+    """
+    values = _scope_values(address, beds, kind)
+    scopes = []
+    for fields in SCOPES:
+        if all(f in values for f in fields):
+            scope = {f: values[f] for f in fields}
+            scopes.append(("|".join(f"{f}={v}" for f, v in scope.items()), scope))
+    return scopes
+
+
+def _sample(listing: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    values = _listing_values(listing)
+    price = values.get("price")
+    if not isinstance(price, (int, float)) or price <= 0:
+        return None
+    sqft = values.get("sqft")
+    ppsf = round(price / sqft, 4) if isinstance(sqft, (int, float)) and sqft > 0 else None
+    return {"price": price, "ppsf": ppsf}
+
+
+def bucket(value: float) -> int:
+    return math.floor(math.log(value) / math.log1p(BUCKET_GROWTH))
+
+
+def bucket_value(index: int) -> float:
+    """Geometric midpoint of a bucket."""
+    return (1 + BUCKET_GROWTH) ** (index + 0.5)
+
+
+def _listing_scopes(listing: Dict[str, Any]) -> List[Tuple[str, Dict[str, str]]]:
+    return stat_scopes(listing.get("address"), _listing_values(listing).get("beds"), listing_type(listing))
+
+
+def _contributions(listing: Optional[Dict[str, Any]]) -> Counter:
+    """
+    {(stat_id, field): +1} for every counter/bucket this listing adds to.
+    """
+    counts = Counter()
+    sample = _sample(listing) if listing else None
+    if not sample:
+        return counts
+    for stat_id, _ in _listing_scopes(listing):
+        for key, hist, count_field in HISTOGRAMS:
+            if sample[key] is not None:
+                counts[(stat_id, f"{hist}.{bucket(sample[key])}")] += 1
+                counts[(stat_id, count_field)] += 1
+    return counts
+
+
+def record_listing(listing: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Apply the change from `previous` (the stored version before this upsert,
+    None if new) to `listing` to the stats rows as atomic increments.
+    """
+    delta = _contributions(listing)
+    delta.subtract(_contributions(previous))
+
+    by_row: Dict[str, Dict[str, int]] = {}
+    for (stat_id, field), n in delta.items():
+        if n:
+            by_row.setdefault(stat_id, {})[field] = n
+    if not by_row:
+        return
+
+    scopes = dict(_listing_scopes(listing))
+    if previous:
+        scopes.update(_listing_scopes(previous))
+    now = datetime.now(timezone.utc).isoformat()
+    for stat_id, inc in by_row.items():
+        db.update_listing_stats(
+            stat_id, {"$inc": inc, "$set": {"updated_at": now}, "$setOnInsert": {"scope": scopes[stat_id]}}
+        )
+
+
+def upsert_listing(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Upsert a ground-truth listing and keep listing_stats in step.
+    Returns the previous version of the listing, or None if it is new.
+    """
+    previous = db.upsert_listing(doc)
+    record_listing(doc, previous)
+    return previous
+
+
+def rebuild_listing_stats() -> int:
+    """Recompute every stats row from property_db.listings. Returns listings scanned."""
+    db.clear_listing_stats()
+    scanned = 0
+    for listing in db.iter_listings():
+        if listing.get("property_id"):
+            record_listing(listing)
+            scanned += 1
+    return scanned
+
+
+def _distribution(hist: Optional[Dict[str, int]]) -> Optional[Dict[str, float]]:
+    """Percentiles from a bucket histogram (each bucket reported at its midpoint)."""
+    buckets = sorted((int(b), n) for b, n in (hist or {}).items() if n > 0)
+    total = sum(n for _, n in buckets)
+    if not total:
+        return None
+    dist = {}
+    for name, q in PERCENTILES:
+        rank = q * (total - 1)
+        seen = 0
+        for index, n in buckets:
+            seen += n
+            if seen > rank:
+                dist[name] = round(bucket_value(index), 2)
+                break
+    return dist
+
+
+def summarize(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "_id": row["_id"],
+        "scope": row.get("scope", {}),
+        "count": row.get("count", 0),
+        "sqft_count": row.get("ppsf_count", 0),
+        "price": _distribution(row.get("price_hist")),
+        "price_per_sqft": _distribution(row.get("ppsf_hist")),
+        "updated_at": row.get("updated_at"),
+    }
+
+
+def neighborhood_stats(address: Optional[Dict[str, Any]], beds: Any, kind: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    The most specific `kind` ("rent"/"sale", see listing_type) stats row for
+    this location with at least MIN_STATS_SAMPLES listings, fetched in one
+    indexed lookup and summarized.
+    """
+    scopes = stat_scopes(address, beds, kind)
+    if not scopes:
+        return None
+    rows = {row["_id"]: row for row in db.find_listing_stats(stat_id for stat_id, _ in scopes)}
+    for stat_id, _ in scopes:
+        row = rows.get(stat_id)
+        if row and row.get("count", 0) >= MIN_STATS_SAMPLES:
+            return summarize(row)
+    return None
+
+
+def _fences(dist: Dict[str, float]) -> Tuple[float, float]:
+    # Tukey fences: anything beyond 1.5 IQR from the quartiles is an outlier
+    iqr = dist["p75"] - dist["p25"]
+    return dist["p25"] - 1.5 * iqr, dist["p75"] + 1.5 * iqr
+
+
+def assess_price(listing: Dict[str, Any], row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compare a (normalized) listing with a stats row and flag price anomalies.
+    """
+    scope = ", ".join(f"{k}={v}" for k, v in row["scope"].items())
+    assessment = {
+        "scope": scope,
+        "listings_in_scope": row["count"],
+        "price": row.get("price"),
+        "price_per_sqft": row.get("price_per_sqft"),
+        "flags": [],
+    }
+    sample = _sample(listing)
+    if not sample or not row.get("price"):
+        return assessment
+
+    median = row["price"]["median"]
+    assessment["listing_price"] = sample["price"]
+    if median:
+        assessment["price_vs_median_pct"] = round((sample["price"] - median) / median * 100, 1)
+
+    checks = [("price", sample["price"], row.get("price"), row["count"])]
+    if sample["ppsf"] is not None:
+        checks.append(("price per sqft", sample["ppsf"], row.get("price_per_sqft"), row.get("sqft_count", 0)))
+    for label, value, dist, count in checks:
+        if not dist or count < MIN_FENCE_SAMPLES:
+            continue
+        low, high = _fences(dist)
+        if value < low:
+            assessment["flags"].append(
+                f"Listed {label} {value:,.2f} is unusually LOW for {scope} (median {dist['median']:,.2f}, low fence {low:,.2f})"
+            )
+        elif value > high:
+            assessment["flags"].append(
+                f"Listed {label} {value:,.2f} is unusually HIGH for {scope} (median {dist['median']:,.2f}, high fence {high:,.2f})"
+            )
+    return assessment
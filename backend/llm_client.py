@@ -1,44 +1,115 @@
 # llm_client.py
 import os
-import backoff
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import SystemMessage, HumanMessage
-from dotenv import load_dotenv
+import threading
+from config import load_env
+from llm_policy import CallPolicy, LLMCallError, Tier
 
-# Load environment variables (ensure GEMINI_API_KEY is in your .env)
-load_dotenv()
+# Models are built on first use (or by warmup()), not at import time:
+# importing langchain_google_genai alone costs seconds of startup.
+# Tiers are tried in order; the first is the fast, cheap default and later
+# ones are fallbacks (override with GEMINI_MODEL_TIERS="model-a,model-b").
+DEFAULT_MODEL_TIERS = "gemini-2.0-flash,gemini-2.0-flash-lite"
 
-# Initialize the Model once (efficient)
-# using "gemini-1.5-flash" as it's fast and cheap for agents
-_llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash",
-    temperature=0.2,
-    max_retries=2,
-)
+_llms = {}
+_policy = None
+_llm_lock = threading.Lock()
 
-def call_gemini_chat(system_prompt, user_prompt, max_tokens=512, temperature=0.2):
+def model_tiers():
+    load_env()
+    return [m.strip() for m in os.getenv("GEMINI_MODEL_TIERS", DEFAULT_MODEL_TIERS).split(",") if m.strip()]
+
+def call_deadline():
+    """Per-attempt deadline in seconds (LLM_CALL_DEADLINE_SECONDS)."""
+    load_env()
+    return float(os.getenv("LLM_CALL_DEADLINE_SECONDS", "30"))
+
+def get_llm(model=None):
+    """
+    Return the shared Gemini chat model for `model` (default: first tier),
+    constructing it on first call.
+    """
+    model = model or model_tiers()[0]
+    if model not in _llms:
+        with _llm_lock:
+            if model not in _llms:
+                # Load environment variables (ensure GOOGLE_API_KEY is in your .env)
+                load_env()
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                _llms[model] = ChatGoogleGenerativeAI(
+                    model=model,
+                    temperature=0.2,
+                    # Retries, hedging and fallback are handled by the call policy
+                    max_retries=0,
+                    timeout=call_deadline(),
+                )
+    return _llms[model]
+
+def call_gemini_chat(system_prompt, user_prompt, max_tokens=512, temperature=0.2, model=None):
+    """
+    Executes a real call to Google Gemini. Raises on failure; use
+    safe_call_gemini_chat for retries, hedging and model fallback.
+    """
+    from langchain_core.messages import SystemMessage, HumanMessage
+    messages = [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=user_prompt)
+    ]
+
+    # Invoke the model
+    response = get_llm(model).invoke(messages)
+    # print("LLM Response:", response.content)
+
+    # Return just the text content
+    return response.content
+
+def get_policy():
+    """
+    The shared CallPolicy over the configured Gemini tiers.
     """
-    Executes a real call to Google Gemini.
+    global _policy
+    if _policy is None:
+        with _llm_lock:
+            if _policy is None:
+                deadline = call_deadline()
+                tiers = [
+                    Tier(model, lambda s, u, model=model: call_gemini_chat(s, u, model=model), deadline)
+                    for model in model_tiers()
+                ]
+                _policy = CallPolicy(
+                    tiers,
+                    attempts_per_tier=int(os.getenv("LLM_ATTEMPTS_PER_TIER", "2")),
+                    total_deadline=float(os.getenv("LLM_TOTAL_DEADLINE_SECONDS", "60")),
+                    hedge=os.getenv("LLM_HEDGE", "1") == "1",
+                    # Concurrent Gemini calls (incl. hedges and abandoned calls) per process
+                    max_workers=int(os.getenv("LLM_MAX_WORKERS", "16")),
+                )
+    return _policy
+
+def latency_stats():
+    """Per-tier latency percentiles and outcome counters ({} before the first call)."""
+    return _policy.stats() if _policy is not None else {}
+
+def warmup():
+    """
+    Pay the import/construction cost up front (e.g. before a server starts taking traffic).
+    """
+    for model in model_tiers():
+        get_llm(model)
+    get_policy()
+
+def safe_call_gemini_chat(system_prompt, user_prompt, max_tokens=512, temperature=0.2):
+    """
+    Call Gemini through the tail-latency policy (hedged requests, per-call
+    deadlines, retries, tier fallback). Never raises.
     """
     try:
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt)
-        ]
-        
-        # Invoke the model
-        response = _llm.invoke(messages)
-        # print("LLM Response:", response.content)
-        
-        # Return just the text content
-        return response.content
-        
+        return get_policy().call(system_prompt, user_prompt)
+    except LLMCallError as e:
+        print(f"LLM Call Failed: {e} ({e.__cause__})")
+        # Fallback if API fails, so the app doesn't crash
+        return "Error: Unable to generate response from Gemini at this time."
     except Exception as e:
+        # e.g. a malformed LLM_* setting while building the policy
         print(f"LLM Call Failed: {e}")
         # Fallback if API fails, so the app doesn't crash
         return "Error: Unable to generate response from Gemini at this time."
-
-# retry/backoff wrapper
-@backoff.on_exception(backoff.expo, Exception, max_tries=3)
-def safe_call_gemini_chat(system_prompt, user_prompt, max_tokens=512, temperature=0.2):
-    return call_gemini_chat(system_prompt, user_prompt, max_tokens, temperature)
\ No newline at end of file
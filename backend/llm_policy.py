@@ -0,0 +1,259 @@
+# llm_policy.py
+"""
+Tail-latency-aware call policy for LLM requests.
+
+A CallPolicy walks an ordered list of model tiers (e.g. gemini-2.0-flash, then
+a cheaper/faster fallback). For each attempt it:
+  - sends the request and, if it hasn't answered by the tier's observed p95
+    latency, sends one hedged duplicate and takes whichever finishes first;
+  - enforces a per-call deadline, counted from when the call starts running
+    (the slow call is abandoned, not awaited);
+  - retries with jittered exponential backoff on failure; after a timeout,
+    or once a tier's retries are used up, falls back to the next tier.
+Latency/outcome statistics are kept per tier (see `stats()`).
+
+The policy only needs a `invoke(system_prompt, user_prompt) -> str` callable
+per tier, so it can be exercised against a local fake model with injected
+latencies.
+"""
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+
+# How often a caller whose call is still queued checks whether it has started
+QUEUE_POLL_SECONDS = 0.01
+
+
+class LLMCallError(Exception):
+    """Every tier and retry failed."""
+
+
+class DeadlineExceeded(LLMCallError):
+    """A single attempt ran past its deadline."""
+
+
+class Tier:
+    def __init__(self, name: str, invoke: Callable[[str, str], str], deadline: float = 30.0):
+        self.name = name
+        self.invoke = invoke
+        self.deadline = deadline
+
+
+class TierStats:
+    """Rolling latency window plus outcome counters for one tier."""
+
+    def __init__(self, window: int = 200):
+        self.latencies = deque(maxlen=window)
+        self.attempts = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "attempts": self.attempts,
+            "successes": self.successes,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallbacks,
+            "samples": len(self.latencies),
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+class CallPolicy:
+    def __init__(
+        self,
+        tiers: List[Tier],
+        attempts_per_tier: int = 2,
+        total_deadline: Optional[float] = 60.0,
+        hedge: bool = True,
+        default_hedge_delay: float = 5.0,
+        min_hedge_delay: float = 0.05,
+        min_samples: int = 20,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 4.0,
+        max_workers: int = 16,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if not tiers:
+            raise ValueError("CallPolicy needs at least one tier")
+        self.tiers = tiers
+        self.attempts_per_tier = attempts_per_tier
+        self.total_deadline = total_deadline
+        self.hedge = hedge
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._sleep = sleep
+        self._stats = {tier.name: TierStats() for tier in tiers}
+        self._lock = threading.Lock()
+        # Abandoned (timed-out or losing hedge) calls finish here in the background
+        self._max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self._in_flight = 0
+
+    def hedge_delay(self, tier: Tier) -> float:
+        """
+        When to send the hedge: the tier's p95 once we have enough samples,
+        otherwise `default_hedge_delay`; never past the deadline.
+        """
+        with self._lock:
+            stats = self._stats[tier.name]
+            p95 = stats.percentile(0.95) if len(stats.latencies) >= self.min_samples else None
+        delay = self.default_hedge_delay if p95 is None else max(p95, self.min_hedge_delay)
+        return min(delay, tier.deadline)
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            return {name: stats.snapshot() for name, stats in self._stats.items()}
+
+    def _bump(self, tier: Tier, counter: str) -> None:
+        with self._lock:
+            stats = self._stats[tier.name]
+            setattr(stats, counter, getattr(stats, counter) + 1)
+
+    def _timed(self, tier: Tier, system_prompt: str, user_prompt: str, started: Optional[list] = None) -> str:
+        start = time.monotonic()
+        if started is not None:
+            started.append(start)
+        result = tier.invoke(system_prompt, user_prompt)
+        # Every completed call (winner or not) feeds the latency estimate
+        with self._lock:
+            self._stats[tier.name].latencies.append(time.monotonic() - start)
+        return result
+
+    def _released(self, _future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _submit(self, tier: Tier, system_prompt: str, user_prompt: str, started: Optional[list] = None,
+                hedge: bool = False):
+        """
+        Queue a call on the pool. A hedge is only sent when a worker is idle:
+        queued behind busy workers it would start late and add load, not cut latency.
+        """
+        with self._lock:
+            if hedge and self._in_flight >= self._max_workers:
+                return None
+            self._in_flight += 1
+        future = self._executor.submit(self._timed, tier, system_prompt, user_prompt, started)
+        future.add_done_callback(self._released)
+        return future
+
+    def _attempt(self, tier: Tier, system_prompt: str, user_prompt: str, budget_at: Optional[float]) -> str:
+        self._bump(tier, "attempts")
+        # Set by the worker when the primary call actually starts running
+        started = []
+        futures = {self._submit(tier, system_prompt, user_prompt, started): "primary"}
+        try:
+            return self._wait(tier, system_prompt, user_prompt, futures, started, budget_at)
+        finally:
+            # Drop whatever hasn't started (a queued hedge or timed-out call);
+            # calls already running finish in the background and are ignored
+            for future in futures:
+                future.cancel()
+
+    def _wait(self, tier: Tier, system_prompt: str, user_prompt: str, futures: Dict, started: list,
+              budget_at: Optional[float]) -> str:
+        hedged = not self.hedge
+        hedge_delay = self.hedge_delay(tier)
+        error = None
+
+        while futures:
+            now = time.monotonic()
+            # The tier deadline and hedge delay count from when the call starts
+            # running, not from when it was queued; only the total budget
+            # covers time spent waiting for a worker.
+            deadline_at = started[0] + tier.deadline if started else float("inf")
+            if budget_at is not None:
+                deadline_at = min(deadline_at, budget_at)
+            if now >= deadline_at:
+                self._bump(tier, "timeouts")
+                raise DeadlineExceeded(f"{tier.name} did not answer within {tier.deadline:.1f}s")
+            hedge_at = started[0] + hedge_delay if started and not hedged else float("inf")
+            # While queued, check back shortly to pick up the start time
+            wake_at = min(deadline_at, hedge_at, now + QUEUE_POLL_SECONDS if not started else float("inf"))
+            done, _ = wait(futures, timeout=max(wake_at - now, 0), return_when=FIRST_COMPLETED)
+
+            if not done:
+                # A hedge sent at the deadline could never be waited for
+                if hedge_at <= time.monotonic() < deadline_at:
+                    hedged = True
+                    hedge = self._submit(tier, system_prompt, user_prompt, hedge=True)
+                    if hedge is not None:
+                        self._bump(tier, "hedges")
+                        futures[hedge] = "hedge"
+                continue
+
+            for future in done:
+                kind = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The other copy (if any) may still succeed
+                    error = e
+                    continue
+                self._bump(tier, "successes")
+                if kind == "hedge":
+                    self._bump(tier, "hedge_wins")
+                return result
+
+        self._bump(tier, "failures")
+        raise error
+
+    def call(self, system_prompt: str, user_prompt: str) -> str:
+        """
+        Run the request through the tiers. Raises LLMCallError (chained to the
+        last failure) when every attempt fails.
+        """
+        started = time.monotonic()
+        budget_at = started + self.total_deadline if self.total_deadline is not None else None
+        last_error = None
+        retry = 0
+
+        for index, tier in enumerate(self.tiers):
+            for _ in range(self.attempts_per_tier):
+                if retry:
+                    # Full-jitter exponential backoff between attempts
+                    self._sleep(random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** (retry - 1))))
+                retry += 1
+
+                if budget_at is not None and time.monotonic() >= budget_at:
+                    raise LLMCallError("LLM call budget exhausted") from last_error
+                try:
+                    result = self._attempt(tier, system_prompt, user_prompt, budget_at)
+                except DeadlineExceeded as e:
+                    # A tier that just timed out will likely time out again;
+                    # spend the remaining budget on the next tier instead
+                    last_error = e
+                    print(f"LLM attempt on {tier.name} timed out, moving to the next tier: {e}")
+                    break
+                except Exception as e:
+                    last_error = e
+                    print(f"LLM attempt on {tier.name} failed: {e}")
+                    continue
+                if index > 0:
+                    self._bump(tier, "fallbacks")
+                return result
+
+        raise LLMCallError("All LLM tiers failed") from last_error
@@ -0,0 +1,50 @@
+# scripts/export_results.py
+"""
+Export completed analyses from property_db.results as NDJSON or Parquet.
+
+Results are streamed through a batched server-side cursor, so memory stays
+constant regardless of how many are exported. Throughput is reported on
+stderr when the export finishes.
+
+Usage
+$ python3 scripts/export_results.py --format ndjson --since 2026-01-01 --until 2026-02-01 > results.ndjson
+$ python3 scripts/export_results.py --format parquet --domain greenstrealty.com --out results.parquet
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Make backend/ importable when run as `python3 scripts/export_results.py`
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import export
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--format", choices=export.FORMATS, default="ndjson")
+    parser.add_argument("--since", type=export.parse_date, help="ISO date/datetime, inclusive (UTC)")
+    parser.add_argument("--until", type=export.parse_date, help="ISO date/datetime, exclusive (UTC)")
+    parser.add_argument("--domain", help="only results for this listing domain, e.g. greenstrealty.com")
+    parser.add_argument("--batch-size", type=int, default=export.CHUNK_ROWS, help="cursor batch size")
+    parser.add_argument("--out", help="output file (default: stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stats = export.ExportStats()
+    rows = export.iter_rows(args.since, args.until, args.domain, stats=stats, batch_size=args.batch_size)
+    chunks = export.export_chunks(args.format, rows)
+
+    out = open(args.out, "wb") if args.out else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.out:
+            out.close()
+    print(f"Exported {stats}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
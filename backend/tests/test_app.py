@@ -0,0 +1,49 @@
+# tests/test_app.py
+import app as app_module
+
+ERROR_STATE = {"address": "https://example.com/x", "raw_data": [], "discrepancies": [],
+               "summary": "Error: Could not scrape data. 404"}
+
+
+def test_error_state_fails_the_lease(monkeypatch):
+    released = []
+    monkeypatch.setattr(app_module, "run_workflow_sync", lambda state: dict(ERROR_STATE))
+    monkeypatch.setattr(app_module, "save_result", lambda job_id, state, run_id=None: None)
+    monkeypatch.setattr(app_module.coalesce, "fail", lambda *args: released.append(("fail",) + args))
+    monkeypatch.setattr(app_module.coalesce, "complete", lambda *args: released.append(("complete",) + args))
+
+    app_module._job_store["job-a"] = {"status": "running"}
+    app_module._background_job("job-a", ERROR_STATE["address"], "key")
+    assert released == [("fail", "key", "job-a", ERROR_STATE["summary"])]
+
+
+def test_follower_poll_survives_mongo_outage(monkeypatch):
+    def down(*args):
+        raise ConnectionError("mongo down")
+
+    monkeypatch.setattr(app_module.coalesce, "follower_status", down)
+    app_module._job_store["job-b"] = {"status": "running", "coalesce_key": "key", "follows": "job-a"}
+
+    resp = app_module.app.test_client().get("/api/result/job-b")
+    assert resp.status_code == 200
+    # "running" keeps the frontend polling; "failed" would end it for good
+    assert resp.get_json()["status"] == "running"
+    assert app_module._job_store["job-b"]["status"] == "running"
+
+
+def test_reuse_reads_leader_result_from_primary(monkeypatch):
+    reads = []
+    saved = {}
+
+    def get_result(job_id, primary=False):
+        reads.append((job_id, primary))
+        return {"summary": "done"} if primary else None
+
+    monkeypatch.setattr(app_module.coalesce, "acquire", lambda key, job_id: (app_module.coalesce.REUSE, "job-a"))
+    monkeypatch.setattr(app_module, "get_result", get_result)
+    monkeypatch.setattr(app_module, "save_result", lambda job_id, state, run_id=None: saved.__setitem__(job_id, (state, run_id)))
+
+    resp = app_module.app.test_client().post("/api/analyze", json={"url": "https://example.com/x"})
+    assert resp.get_json()["status"] == "complete"
+    assert reads == [("job-a", True)]
+    assert saved[resp.get_json()["job_id"]] == ({"summary": "done"}, "job-a")
@@ -0,0 +1,104 @@
+# tests/test_chat_router.py
+from chat_router import answer_structured
+
+STATE = {
+    "raw_data": [
+        {
+            "source": "Live Web Listing",
+            "data": {
+                "price": 1995,
+                "beds": 3.0,
+                "baths": 2.5,
+                "sqft": 1470,
+                "address": {"line1": "304 S. STATE ST", "city": "Champaign", "state": "IL", "zip": None},
+                "agent": {"name": "Green Street Realty", "phone": None},
+            },
+        },
+        {"source": "AI Extracted Features", "data": "- Dishwasher\n- Central AC"},
+        {
+            "source": "OFFICIAL RECORD",
+            "data": {
+                "property_id": "greenst_002_state_st",
+                "address": {"line1": "304 S. STATE ST", "city": "CHAMPAIGN", "state": "IL", "zip": "61820"},
+                "listing": {"price": 895, "beds": 2, "baths": 1, "sqft": 1470, "lot_sqft": None, "year_built": 2005},
+            },
+        },
+    ],
+    "summary": "...",
+    "discrepancies": "...",
+}
+
+
+def test_field_lookup_cites_web_listing():
+    assert answer_structured(STATE, "What's the price?") == "Price: $1,995 [source: Live Web Listing]"
+    answer = answer_structured(STATE, "how many beds and baths?")
+    assert answer == "Beds: 3 [source: Live Web Listing]\nBaths: 2.5 [source: Live Web Listing]"
+
+
+def test_lookup_prefers_official_record_when_asked():
+    assert answer_structured(STATE, "What price is on the official record?") == "Price: $895 [source: OFFICIAL RECORD]"
+    # Only the official record knows the year built
+    assert answer_structured(STATE, "What year was it built?") == "Year built: 2005 [source: OFFICIAL RECORD]"
+
+
+def test_comparison():
+    answer = answer_structured(STATE, "Does the price match the official record?")
+    assert answer.startswith("Price differs: listing says $1,995")
+    assert "$895 [source: OFFICIAL RECORD]" in answer
+    assert answer_structured(STATE, "Is the sqft consistent?").startswith("Sqft matches: 1,470 sqft")
+
+
+def test_composite_comparison_ignores_missing_subfields():
+    # The scraped address has no zip; only line1/city/state are compared
+    answer = answer_structured(STATE, "Does the address match the official record?")
+    assert answer.startswith("Address matches: 304 S. STATE ST, Champaign, IL")
+    # The official record has no agent at all
+    assert answer_structured(STATE, "Does the agent match the record?") is None
+
+
+def test_open_ended_and_unresolvable_fall_through():
+    assert answer_structured(STATE, "Is this a good deal for the price?") is None
+    assert answer_structured(STATE, "What amenities are included?") is None
+    assert answer_structured(STATE, "Tell me about the kitchen") is None
+    # Mentioning a field word is not enough; the field must be what's asked for
+    assert answer_structured(STATE, "Is the master bedroom carpeted?") is None
+    assert answer_structured(STATE, "Are bedrooms furnished?") is None
+    assert answer_structured(STATE, "Does the bathroom have a tub?") is None
+    assert answer_structured(STATE, "Has the price changed recently?") is None
+    assert answer_structured(STATE, "Is the rent too high?") is None
+    assert answer_structured(STATE, "Can I contact the agent on weekends?") is None
+    # lot size is null in every source, so the model should handle it
+    assert answer_structured(STATE, "What's the lot size?") is None
+
+
+def test_lookup_shapes():
+    assert answer_structured(STATE, "How much is the rent?") == "Price: $1,995 [source: Live Web Listing]"
+    assert answer_structured(STATE, "How many bedrooms does it have?") == "Beds: 3 [source: Live Web Listing]"
+    assert answer_structured(STATE, "Who is the agent?") == "Agent: Green Street Realty [source: Live Web Listing]"
+    assert answer_structured(STATE, "sqft?") == "Sqft: 1,470 sqft [source: Live Web Listing]"
+    # No source has the agent's phone, so the model handles it
+    assert answer_structured(STATE, "What is the agent's phone number?") is None
+
+
+def test_lot_size_is_not_sqft():
+    official = {**STATE["raw_data"][2]["data"]}
+    official["listing"] = {**official["listing"], "lot_sqft": 6000}
+    state = {"raw_data": [STATE["raw_data"][0], {"source": "OFFICIAL RECORD", "data": official}]}
+    assert answer_structured(state, "What is the lot size?") == "Lot size: 6,000 sqft [source: OFFICIAL RECORD]"
+    assert answer_structured(state, "What's the size?") == "Sqft: 1,470 sqft [source: Live Web Listing]"
+
+
+def test_agent_phone_comes_from_the_named_agents_source():
+    official = {**STATE["raw_data"][2]["data"], "agent": {"name": "Other Realty", "phone": "217-555-0100"}}
+    state = {"raw_data": [STATE["raw_data"][0], {"source": "OFFICIAL RECORD", "data": official}]}
+    # The listing names a different agent and has no phone for them
+    assert answer_structured(state, "Who is the agent?") == "Agent: Green Street Realty [source: Live Web Listing]"
+    assert answer_structured(state, "What's the agent phone?") is None
+    assert answer_structured(state, "What's the agent phone on the official record?") == \
+        "Agent phone: 217-555-0100 [source: OFFICIAL RECORD]"
+
+
+def test_missing_official_record():
+    state = {"raw_data": [STATE["raw_data"][0], {"source": "OFFICIAL RECORD", "data": "No matching records found."}]}
+    assert answer_structured(state, "how many bedrooms?") == "Beds: 3 [source: Live Web Listing]"
+    assert answer_structured(state, "does the price match?") is None
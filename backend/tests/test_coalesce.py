@@ -0,0 +1,113 @@
+# tests/test_coalesce.py
+import time
+
+import pytest
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+import coalesce
+
+URL = "https://www.greenstrealty.com/properties/profile/stoneway-condos#photos"
+
+
+class FakeLeases:
+    """Just enough of a pymongo Collection for the queries coalesce.py issues."""
+
+    OPS = {"$gt": lambda a, b: a > b, "$gte": lambda a, b: a >= b,
+           "$lt": lambda a, b: a < b, "$lte": lambda a, b: a <= b}
+
+    def __init__(self):
+        self.docs = {}
+
+    def _matches(self, doc, query):
+        for field, cond in query.items():
+            if field == "$or":
+                if not any(self._matches(doc, q) for q in cond):
+                    return False
+            elif isinstance(cond, dict):
+                value = doc.get(field)
+                if value is None or not all(self.OPS[op](value, arg) for op, arg in cond.items()):
+                    return False
+            elif doc.get(field) != cond:
+                return False
+        return True
+
+    def insert_one(self, doc):
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError("duplicate")
+        self.docs[doc["_id"]] = dict(doc)
+
+    def find_one(self, query):
+        return next((dict(d) for d in self.docs.values() if self._matches(d, query)), None)
+
+    def find_one_and_update(self, query, update, return_document=ReturnDocument.BEFORE):
+        for doc in self.docs.values():
+            if self._matches(doc, query):
+                before = dict(doc)
+                doc.update(update.get("$set", {}))
+                for field, value in update.get("$addToSet", {}).items():
+                    doc[field] = doc[field] + [value] if value not in doc[field] else doc[field]
+                return dict(doc) if return_document == ReturnDocument.AFTER else before
+        return None
+
+    def update_one(self, query, update):
+        self.find_one_and_update(query, update)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    leases = FakeLeases()
+    results = {}
+    monkeypatch.setattr(coalesce.db, "analysis_leases", lambda: leases)
+    monkeypatch.setattr(coalesce.db, "save_result", lambda job_id, state, run_id=None: results.__setitem__(job_id, state))
+    monkeypatch.setattr(coalesce.db, "get_result", lambda job_id, primary=False: results.get(job_id) if primary else None)
+    monkeypatch.setenv("ANALYZE_LEASE_SECONDS", "300")
+    monkeypatch.setenv("ANALYZE_REUSE_WINDOW_SECONDS", "60")
+    return leases, results
+
+
+def test_key_ignores_fragment():
+    assert coalesce.coalesce_key(URL) == coalesce.coalesce_key(URL.split("#")[0])
+
+
+def test_followers_attach_and_receive_fanout(store):
+    leases, results = store
+    key = coalesce.coalesce_key(URL)
+    now = time.time()
+    assert coalesce.acquire(key, "job-a", now=now) == (coalesce.LEADER, "job-a")
+    assert coalesce.acquire(key, "job-b", now=now + 1) == (coalesce.FOLLOWER, "job-a")
+    assert coalesce.acquire(key, "job-c", now=now + 2) == (coalesce.FOLLOWER, "job-a")
+    assert coalesce.follower_status(key, "job-a", "job-b") == ("running", None)
+
+    state = {"summary": "ok"}
+    results["job-a"] = state
+    assert coalesce.complete(key, "job-a", state) == ["job-b", "job-c"]
+    assert results["job-b"] == results["job-c"] == state
+    assert coalesce.follower_status(key, "job-a", "job-b") == ("complete", None)
+
+
+def test_reuse_window_then_rerun(store):
+    leases, results = store
+    key = coalesce.coalesce_key(URL)
+    coalesce.acquire(key, "job-a", now=1000)
+    coalesce.complete(key, "job-a", {"summary": "ok"})
+    completed_at = leases.docs[key]["completed_at"]
+
+    assert coalesce.acquire(key, "job-b", now=completed_at + 30) == (coalesce.REUSE, "job-a")
+    # Outside the window the next request becomes the new leader
+    assert coalesce.acquire(key, "job-c", now=completed_at + 61) == (coalesce.LEADER, "job-c")
+    assert leases.docs[key]["followers"] == []
+
+
+def test_failed_or_expired_leader_is_taken_over(store):
+    leases, _ = store
+    key = coalesce.coalesce_key(URL)
+    coalesce.acquire(key, "job-a", now=1000)
+    coalesce.acquire(key, "job-b", now=1001)
+    coalesce.fail(key, "job-a", "scrape blew up")
+    assert coalesce.follower_status(key, "job-a", "job-b") == ("failed", "scrape blew up")
+    assert coalesce.acquire(key, "job-c", now=1002) == (coalesce.LEADER, "job-c")
+
+    # job-c's process dies; once its lease expires someone else may run it
+    assert coalesce.acquire(key, "job-d", now=1002 + 301) == (coalesce.LEADER, "job-d")
+    assert coalesce.follower_status(key, "job-c", "job-x") == ("failed", "coalesced analysis was superseded")
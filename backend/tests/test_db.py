@@ -0,0 +1,127 @@
+# tests/test_db.py
+import asyncio
+
+import pytest
+import db
+
+
+@pytest.fixture
+def fresh_clients(monkeypatch):
+    # MongoClient connects lazily, so an unreachable URI is fine for config checks
+    monkeypatch.setenv("MONGO_URI", "mongodb://localhost:1")
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "7")
+    monkeypatch.setenv("MONGO_MIN_POOL_SIZE", "2")
+    monkeypatch.setenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "250")
+    monkeypatch.setenv("MONGO_READ_PREFERENCE", "secondaryPreferred")
+    monkeypatch.setattr(db, "_mongo_client", None)
+    monkeypatch.setattr(db, "_async_mongo_client", None)
+    monkeypatch.setattr(db, "_pool_stats", {})
+    monkeypatch.setattr(db, "_client_options", {})
+    yield
+    if db._mongo_client is not None:
+        db._mongo_client.close()
+    if db._async_mongo_client is not None:
+        asyncio.run(db._async_mongo_client.close())
+
+
+def test_client_uses_configured_pool(fresh_clients):
+    pool = db.get_db_client().options.pool_options
+    assert pool.max_pool_size == 7
+    assert pool.min_pool_size == 2
+    assert pool.wait_queue_timeout == 0.25
+    assert db.get_db_client() is db.get_db_client()
+
+    async_pool = db.get_async_db_client().options.pool_options
+    assert async_pool.max_pool_size == 7
+
+
+def test_reads_routed_by_read_preference(fresh_clients):
+    listings = db._read_collection(db.get_database(), "listings")
+    assert listings.read_preference.mongos_mode == "secondaryPreferred"
+    # writes keep the database default (primary)
+    assert db.get_database().results.read_preference.mongos_mode == "primary"
+
+
+def test_pool_stats_counts_events(fresh_clients):
+    listener = db._pool_listener("sync")
+    listener.pool_created(None)
+    listener.connection_created(None)
+    listener.connection_checked_out(None)
+    listener.connection_checked_out(None)
+    listener.connection_checked_in(None)
+    listener.connection_check_out_failed(None)
+
+    sync = db.pool_stats()["sync"]
+    assert sync["pools"] == 1
+    assert sync["connections_open"] == 1
+    assert sync["checkouts"] == 2
+    assert sync["connections_in_use"] == 1
+    assert sync["checkout_failures"] == 1
+
+
+def test_pool_stats_report_options_clients_were_built_with(fresh_clients, monkeypatch):
+    db.get_db_client()
+    # Changing the environment afterwards doesn't change the live pool
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "99")
+    monkeypatch.setenv("MONGO_READ_PREFERENCE", "primary")
+
+    options = db.pool_stats()["sync"]["options"]
+    assert options["maxPoolSize"] == 7
+    assert options["read_preference"] == "secondaryPreferred"
+    assert db._read_collection(db.get_database(), "results").read_preference.mongos_mode == "secondaryPreferred"
+    assert "async" not in db.pool_stats()
+
+
+def test_canonical_query_escapes_regex():
+    query = db._canonical_query("3310-3316 (Rear) Stoneway")
+    assert query["address.line1"]["$regex"] == r"3310\-3316\ \(Rear"
+
+
+class FakeAsyncCollection:
+    def __init__(self):
+        self.docs = {}
+        self.read_preference = None
+
+    async def replace_one(self, query, doc, upsert=False):
+        self.docs[query["job_id"]] = doc
+
+    async def find_one(self, query):
+        if "job_id" in query:
+            return self.docs.get(query["job_id"])
+        return {"address": {"line1": "304 S. STATE ST"}, "query": query}
+
+
+class FakeAsyncDatabase:
+    def __init__(self):
+        self.collections = {}
+
+    def get_collection(self, name, read_preference=None):
+        collection = self.collections.setdefault(name, FakeAsyncCollection())
+        collection.read_preference = read_preference
+        return collection
+
+    def __getattr__(self, name):
+        return self.get_collection(name)
+
+
+def test_async_helpers(monkeypatch):
+    monkeypatch.setenv("MONGO_READ_PREFERENCE", "secondaryPreferred")
+    monkeypatch.setattr(db, "_client_options", {})
+    database = FakeAsyncDatabase()
+    monkeypatch.setattr(db, "get_async_database", lambda: database)
+
+    async def run():
+        await db.async_save_result("job-1", {"summary": "ok"})
+        state = await db.async_get_result("job-1")
+        missing = await db.async_get_result("job-2")
+        found = await db.async_find_canonical_by_address("304 S. STATE ST, Champaign")
+        empty = await db.async_find_canonical_by_address("")
+        return state, missing, found, empty
+
+    state, missing, found, empty = asyncio.run(run())
+    assert state == {"summary": "ok"}
+    assert missing is None
+    assert found["query"] == db._canonical_query("304 S. STATE ST, Champaign")
+    assert empty is None
+    # Lookups follow the configured read preference
+    assert database.collections["listings"].read_preference.mongos_mode == "secondaryPreferred"
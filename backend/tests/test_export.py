@@ -0,0 +1,88 @@
+# tests/test_export.py
+import io
+import json
+
+import pytest
+from bson import ObjectId
+
+import export
+
+DOC = {
+    "_id": ObjectId("6967f4d0a1b2c3d4e5f60718"),
+    "job_id": "job-1",
+    "state": {
+        "address": "https://www.greenstrealty.com/properties/profile/stoneway-condos",
+        "raw_data": [
+            {"source": "Live Web Listing", "data": {
+                "price": 1995, "beds": 3.0, "baths": 2.5, "sqft": 1470,
+                "address": {"line1": "3310-3316 Stoneway", "city": "Champaign", "state": "IL", "zip": None},
+            }},
+            {"source": "OFFICIAL RECORD", "data": "No matching records found."},
+        ],
+        "discrepancies": "No discrepancies found (Ground truth unavailable).",
+        "summary": "Looks legitimate.",
+    },
+}
+
+
+@pytest.fixture
+def results(monkeypatch):
+    calls = []
+
+    def fake_iter_results(start=None, end=None, domain=None, batch_size=1000):
+        calls.append((start, end, domain, batch_size))
+        for i in range(2500):
+            yield {**DOC, "job_id": f"job-{i}"}
+
+    monkeypatch.setattr(export.db, "iter_results", fake_iter_results)
+    return calls
+
+
+def test_flatten_result():
+    row = export.flatten_result(DOC)
+    assert set(row) == set(export.COLUMNS)
+    assert row["domain"] == "www.greenstrealty.com"
+    assert row["price"] == 1995.0
+    assert row["sqft"] == 1470.0
+    assert row["summary"] == "Looks legitimate."
+    assert row["created_at"] == DOC["_id"].generation_time
+    # Older results have no run_id: each was its own run
+    assert row["run_id"] == "job-1"
+    # A coalesced follower's copy points at the leader's run
+    assert export.flatten_result({**DOC, "job_id": "job-2", "run_id": "job-1"})["run_id"] == "job-1"
+
+
+def test_ndjson_export_streams_in_chunks(results):
+    stats = export.ExportStats()
+    chunks = list(export.export_chunks("ndjson", export.iter_rows(stats=stats)))
+    assert len(chunks) == 3  # 1000-row chunks
+    lines = b"".join(chunks).decode().splitlines()
+    assert len(lines) == stats.rows == 2500
+    assert json.loads(lines[-1])["job_id"] == "job-2499"
+    assert stats.rows_per_second > 0
+
+
+def test_parquet_export_round_trip(results):
+    pq = pytest.importorskip("pyarrow.parquet")
+    chunks = list(export.parquet_chunks(export.iter_rows(), row_group_rows=1000))
+    parquet = pq.ParquetFile(io.BytesIO(b"".join(chunks)))
+    assert parquet.num_row_groups == 3
+    table = parquet.read()
+    assert table.num_rows == 2500
+    assert table.column("baths").to_pylist()[0] == 2.5
+
+
+def test_export_endpoint(results):
+    from app import app
+
+    client = app.test_client()
+    resp = client.get("/api/export?format=ndjson&since=2026-01-01&domain=greenstrealty.com")
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/x-ndjson"
+    assert len(resp.get_data().splitlines()) == 2500
+    start, end, domain, _ = results[0]
+    assert start.isoformat() == "2026-01-01T00:00:00+00:00" and end is None
+    assert domain == "greenstrealty.com"
+
+    assert client.get("/api/export?format=csv").status_code == 400
+    assert client.get("/api/export?since=yesterday").status_code == 400
@@ -0,0 +1,49 @@
+# tests/test_import_time.py
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+# Cumulative import time budget for each entry module, in milliseconds
+IMPORT_BUDGET_MS = int(os.getenv("IMPORT_TIME_BUDGET_MS", "1000"))
+# Clients that must only be loaded on first use / warmup()
+LAZY_MODULES = ("langchain_google_genai", "langchain_core", "pymongo")
+
+
+def import_profile(module):
+    """
+    Import `module` in a fresh interpreter with `-X importtime` and return
+    {imported module name: cumulative microseconds}.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "EAGER_INIT": "0"},
+    )
+    assert proc.returncode == 0, proc.stderr
+    profile = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+@pytest.mark.parametrize("module", ["agent", "app"])
+def test_import_time_within_budget(module):
+    profile = import_profile(module)
+    elapsed_ms = profile[module] / 1000
+    assert elapsed_ms < IMPORT_BUDGET_MS, f"import {module} took {elapsed_ms:.0f}ms (budget {IMPORT_BUDGET_MS}ms)"
+
+
+@pytest.mark.parametrize("module", ["agent", "app"])
+def test_heavy_clients_are_not_imported_eagerly(module):
+    profile = import_profile(module)
+    eager = [name for name in profile if name.split(".")[0] in LAZY_MODULES]
+    assert not eager, f"import {module} pulled in {sorted(eager)[:5]}"
@@ -0,0 +1,119 @@
+# tests/test_listing_stats.py
+import statistics
+from collections import Counter
+
+import pytest
+
+import listing_stats
+from listing_stats import stat_scopes, summarize, assess_price, record_listing
+
+LISTING = {
+    "property_id": "greenst_002_state_st",
+    "address": {"line1": "304 S. STATE ST", "city": "Champaign", "state": "IL", "zip": "61820"},
+    "listing": {"price": 900, "beds": 2, "baths": 1, "sqft": 1000},
+}
+
+
+def test_stat_scopes_most_specific_first():
+    ids = [stat_id for stat_id, _ in stat_scopes(LISTING["address"], 2.0, "rent")]
+    assert ids == ["type=rent|zip=61820|beds=2", "type=rent|zip=61820",
+                   "type=rent|city=CHAMPAIGN|beds=2", "type=rent|city=CHAMPAIGN"]
+    # scraped greenst addresses have no zip
+    assert [i for i, _ in stat_scopes({"city": "Champaign", "zip": None}, None, "sale")] == ["type=sale|city=CHAMPAIGN"]
+    # Without a listing type there is nothing comparable
+    assert stat_scopes(LISTING["address"], 2, None) == []
+
+
+def test_rents_and_sales_never_share_a_row():
+    assert listing_stats.listing_type(LISTING) == "rent"
+    assert listing_stats.listing_type({"price": 350000}) == "sale"
+    assert listing_stats.listing_type({"price": 45000, "listing_type": "rent"}) == "rent"
+    assert listing_stats.listing_type({"price": None}) is None
+    sale = {**LISTING, "listing": {**LISTING["listing"], "price": 350000}}
+    assert not set(listing_stats._contributions(LISTING)) & set(listing_stats._contributions(sale))
+
+
+def _row(prices, ppsf=()):
+    hist = lambda values: {str(b): n for b, n in Counter(listing_stats.bucket(v) for v in values).items()}
+    return {"_id": "city=CHAMPAIGN", "scope": {"city": "CHAMPAIGN"}, "count": len(prices),
+            "ppsf_count": len(ppsf), "price_hist": hist(prices), "ppsf_hist": hist(ppsf)}
+
+
+def test_summarize_percentiles_from_histogram():
+    row = summarize(_row([800, 900, 1000, 1100, 1200, 1000], [0.8, 0.9, 1.0, 1.1, 1.2]))
+    assert row["count"] == 6
+    assert row["sqft_count"] == 5
+    # Bucket midpoints are within half a bucket (~1%) of the true values
+    assert row["price"]["median"] == pytest.approx(1000, rel=0.01)
+    assert row["price"]["p10"] == pytest.approx(800, rel=0.01)
+    assert row["price_per_sqft"]["p75"] == pytest.approx(1.1, rel=0.01)
+    assert summarize(_row([]))["price"] is None
+
+
+def test_histogram_stays_bounded():
+    prices = [100_000 + 5 * i for i in range(20_000)]
+    row = _row(prices)
+    # 20k listings spanning 100k-200k fit in ~35 buckets
+    assert len(row["price_hist"]) <= 36
+    assert summarize(row)["price"]["median"] == pytest.approx(statistics.median(prices), rel=0.01)
+
+
+def test_assess_price_flags_outliers():
+    row = {"scope": {"city": "CHAMPAIGN"}, "count": 20,
+           "price": {"p10": 840, "p25": 900, "median": 1000, "p75": 1100, "p90": 1160},
+           "price_per_sqft": None}
+    normal = assess_price({"price": 1050, "sqft": None}, row)
+    assert normal["flags"] == []
+    assert normal["price_vs_median_pct"] == 5.0
+
+    cheap = assess_price({"price": 450, "sqft": None}, row)
+    assert len(cheap["flags"]) == 1
+    assert "unusually LOW for city=CHAMPAIGN" in cheap["flags"][0]
+
+    # Too few listings for meaningful quartiles: report the stats, don't flag
+    small = assess_price({"price": 450, "sqft": None}, {**row, "count": 5})
+    assert small["flags"] == []
+    assert small["price_vs_median_pct"] == -55.0
+
+
+def _record(monkeypatch, listing, previous=None):
+    calls = []
+    monkeypatch.setattr(listing_stats.db, "update_listing_stats", lambda stat_id, update: calls.append((stat_id, update)))
+    record_listing(listing, previous)
+    return dict(calls)
+
+
+def test_record_listing_increments_new_listing(monkeypatch):
+    updates = _record(monkeypatch, LISTING)
+    assert list(updates) == ["type=rent|zip=61820|beds=2", "type=rent|zip=61820",
+                             "type=rent|city=CHAMPAIGN|beds=2", "type=rent|city=CHAMPAIGN"]
+    inc = updates["type=rent|city=CHAMPAIGN"]["$inc"]
+    assert inc == {
+        "count": 1,
+        f"price_hist.{listing_stats.bucket(900)}": 1,
+        "ppsf_count": 1,
+        f"ppsf_hist.{listing_stats.bucket(0.9)}": 1,
+    }
+    assert updates["type=rent|city=CHAMPAIGN"]["$setOnInsert"] == {"scope": {"type": "rent", "city": "CHAMPAIGN"}}
+
+
+def test_record_listing_moves_listing_between_rows(monkeypatch):
+    moved = {**LISTING, "listing": {**LISTING["listing"], "beds": 3}}
+    updates = _record(monkeypatch, moved, previous=LISTING)
+    # Rows shared by both versions are untouched; only the beds rows change
+    assert sorted(updates) == sorted(["type=rent|zip=61820|beds=2", "type=rent|city=CHAMPAIGN|beds=2",
+                                      "type=rent|zip=61820|beds=3", "type=rent|city=CHAMPAIGN|beds=3"])
+    assert updates["type=rent|zip=61820|beds=2"]["$inc"]["count"] == -1
+    assert updates["type=rent|zip=61820|beds=3"]["$inc"]["count"] == 1
+
+
+def test_record_listing_reprice_moves_bucket(monkeypatch):
+    repriced = {**LISTING, "listing": {**LISTING["listing"], "price": 1500}}
+    inc = _record(monkeypatch, repriced, previous=LISTING)["type=rent|zip=61820"]["$inc"]
+    assert "count" not in inc
+    assert inc[f"price_hist.{listing_stats.bucket(900)}"] == -1
+    assert inc[f"price_hist.{listing_stats.bucket(1500)}"] == 1
+
+
+def test_record_listing_unchanged_is_noop(monkeypatch):
+    assert _record(monkeypatch, LISTING, previous=dict(LISTING)) == {}
@@ -0,0 +1,155 @@
+# tests/test_llm_policy.py
+import random
+import threading
+import time
+
+import pytest
+
+from llm_policy import CallPolicy, DeadlineExceeded, LLMCallError, Tier
+
+
+class FakeModel:
+    """Local stand-in for a model tier with an injected latency distribution."""
+
+    def __init__(self, name, latency, fail_first=0):
+        self.name = name
+        self.latency = latency  # () -> seconds
+        self.fail_first = fail_first
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, system_prompt, user_prompt):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        time.sleep(self.latency())
+        if call <= self.fail_first:
+            raise RuntimeError(f"{self.name} unavailable")
+        return f"{self.name}: {user_prompt}"
+
+
+def policy(*tiers, **kwargs):
+    kwargs.setdefault("sleep", lambda seconds: None)
+    return CallPolicy(list(tiers), **kwargs)
+
+
+def test_hedge_cuts_tail_latency():
+    # 3% of calls stall for 0.5s; hedging after the learned p95 (~10ms) avoids waiting on them
+    rng = random.Random(7)
+    model = FakeModel("flash", lambda: 0.5 if rng.random() < 0.03 else 0.01)
+    p = policy(Tier("flash", model, deadline=2.0), default_hedge_delay=0.03, min_samples=10)
+
+    elapsed = []
+    for _ in range(100):
+        start = time.monotonic()
+        assert p.call("sys", "q") == "flash: q"
+        elapsed.append(time.monotonic() - start)
+
+    stats = p.stats()["flash"]
+    assert stats["hedges"] > 0 and stats["hedge_wins"] > 0
+    # Only a stalled primary *and* a stalled hedge can still take the full 0.5s
+    assert sum(e > 0.3 for e in elapsed) <= 1
+    assert stats["p50"] is not None and stats["p95"] is not None
+
+
+def test_deadline_then_fallback_to_next_tier():
+    slow = FakeModel("flash", lambda: 1.0)
+    lite = FakeModel("flash-lite", lambda: 0.01)
+    p = policy(Tier("flash", slow, deadline=0.1), Tier("flash-lite", lite, deadline=0.5),
+               attempts_per_tier=1, hedge=False)
+
+    start = time.monotonic()
+    assert p.call("sys", "q") == "flash-lite: q"
+    assert time.monotonic() - start < 0.5
+    stats = p.stats()
+    assert stats["flash"]["timeouts"] == 1
+    assert stats["flash-lite"]["fallbacks"] == 1
+
+
+def test_retries_on_failure_with_backoff():
+    sleeps = []
+    flaky = FakeModel("flash", lambda: 0.0, fail_first=1)
+    p = policy(Tier("flash", flaky, deadline=1.0), attempts_per_tier=2, hedge=False, sleep=sleeps.append)
+
+    assert p.call("sys", "q") == "flash: q"
+    assert flaky.calls == 2
+    assert len(sleeps) == 1 and 0 <= sleeps[0] <= 0.5
+    assert p.stats()["flash"]["failures"] == 1
+
+
+def test_all_tiers_failing_raises():
+    p = policy(Tier("flash", FakeModel("flash", lambda: 0.0, fail_first=99), deadline=1.0),
+               Tier("flash-lite", FakeModel("flash-lite", lambda: 0.2), deadline=0.05),
+               attempts_per_tier=1, hedge=False)
+    with pytest.raises(LLMCallError) as exc:
+        p.call("sys", "q")
+    assert isinstance(exc.value.__cause__, DeadlineExceeded)
+
+
+def test_hedge_skipped_without_idle_worker():
+    model = FakeModel("flash", lambda: 0.1)
+    p = policy(Tier("flash", model, deadline=1.0), default_hedge_delay=0.02, max_workers=1)
+
+    assert p.call("sys", "q") == "flash: q"
+    assert model.calls == 1
+    assert p.stats()["flash"]["hedges"] == 0
+
+
+def test_timed_out_queued_call_is_cancelled():
+    model = FakeModel("flash", lambda: 0.3)
+    p = policy(Tier("flash", model, deadline=1.0), attempts_per_tier=1, total_deadline=0.1,
+               hedge=False, max_workers=1)
+    busy = threading.Thread(target=lambda: p._submit(p.tiers[0], "sys", "busy").result())
+    busy.start()
+    time.sleep(0.02)
+
+    # Queued behind the busy worker until the budget runs out; must never reach the model
+    with pytest.raises(LLMCallError):
+        p.call("sys", "q")
+    busy.join()
+    time.sleep(0.05)
+    assert model.calls == 1
+
+
+def test_queue_wait_does_not_count_against_tier_deadline():
+    model = FakeModel("flash", lambda: 0.15)
+    p = policy(Tier("flash", model, deadline=0.2), attempts_per_tier=1, hedge=False, max_workers=1)
+    busy = threading.Thread(target=lambda: p._submit(p.tiers[0], "sys", "busy").result())
+    busy.start()
+    time.sleep(0.02)
+
+    # ~0.13s queued + 0.15s running is past 0.2s, but the call itself is within its deadline
+    assert p.call("sys", "q") == "flash: q"
+    busy.join()
+    assert p.stats()["flash"]["timeouts"] == 0
+
+
+def test_timeout_falls_back_within_default_budget_shape():
+    # Same shape as the defaults: tier deadline x attempts per tier == total budget
+    slow = FakeModel("flash", lambda: 1.0)
+    lite = FakeModel("flash-lite", lambda: 0.01)
+    p = policy(Tier("flash", slow, deadline=0.1), Tier("flash-lite", lite, deadline=0.1),
+               attempts_per_tier=2, total_deadline=0.2)
+
+    assert p.call("sys", "q") == "flash-lite: q"
+    # The timed-out tier is not retried
+    assert slow.calls == 1
+    assert p.stats()["flash-lite"]["fallbacks"] == 1
+
+
+def test_safe_call_never_raises(monkeypatch):
+    import llm_client
+
+    failing = policy(Tier("flash", FakeModel("flash", lambda: 0.0, fail_first=99)), attempts_per_tier=1)
+    monkeypatch.setattr(llm_client, "_policy", failing)
+    assert llm_client.safe_call_gemini_chat("sys", "q").startswith("Error:")
+    assert llm_client.latency_stats()["flash"]["failures"] == 1
+
+
+def test_safe_call_never_raises_on_bad_config(monkeypatch):
+    import llm_client
+
+    monkeypatch.setattr(llm_client, "_policy", None)
+    monkeypatch.setenv("LLM_ATTEMPTS_PER_TIER", "two")
+    assert llm_client.safe_call_gemini_chat("sys", "q").startswith("Error:")
+    assert llm_client._policy is None